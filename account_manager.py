@@ -7,21 +7,83 @@ import os
 import json
 import logging
 import datetime
+import functools
 import hashlib
+import hmac
 import secrets
 import re
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, exists, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import relationship, joinedload
 from models import Base
 from database import db_manager
 
+# Optional imports - will be used if available
+try:
+    from argon2 import PasswordHasher, Type
+    from argon2 import exceptions as argon2_exceptions
+    ARGON2_AVAILABLE = True
+except ImportError:
+    ARGON2_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Marks password hashes made with the PBKDF2 fallback scheme, which is used
+# when argon2-cffi is missing; the iteration count is stored in the hash
+PBKDF2_HASH_PREFIX = '$pbkdf2-sha256$'
+PBKDF2_ITERATIONS = 600000
+
+# Marks password hashes made by the earlier keyed BLAKE2b fallback; these are
+# still verified, then upgraded on the next successful login
+BLAKE2_HASH_PREFIX = '$blake2b$'
+
+# How often expired sessions are purged from the database (seconds)
+SESSION_PURGE_INTERVAL = 60 * 60
+
+# In-process cache of validated sessions; the TTL bounds how stale a cached
+# session can get if it is changed by another process
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 60
+
+# Users per page when listing users, and rows fetched per round-trip
+USER_STREAM_BATCH_SIZE = 500
+
+# Dialect-specific INSERT constructs that support ON CONFLICT DO NOTHING
+_CONFLICT_INSERTS = {
+    'postgresql': pg_insert,
+    'sqlite': sqlite_insert,
+}
+
+# Profile fields that users are allowed to update
+_PROFILE_FIELDS = frozenset({
+    'first_name', 'last_name', 'profile_image',
+    'theme', 'default_view', 'notifications_enabled'
+})
+
+# Username should be 3-20 characters, letters, numbers, and underscores only
+_USERNAME_RE = re.compile(r'^[a-zA-Z0-9_]{3,20}$')
+# Simple email validation
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# All registration fields at once, as "username\0email\0password"
+_REGISTRATION_RE = re.compile(
+    r'^[a-zA-Z0-9_]{3,20}\x00[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\x00.{8,}\Z',
+    re.DOTALL
+)
+
 class User(Base):
     """Model representing a user account"""
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_username_active', 'username', 'is_active'),
+        Index('ix_users_email_active', 'email', 'is_active'),
+    )
     
     id = Column(Integer, primary_key=True)
     username = Column(String, unique=True, nullable=False)
@@ -47,26 +109,43 @@ class User(Base):
     def __repr__(self):
         return f"<User(username='{self.username}', email='{self.email}')>"
     
+    # Columns exposed by to_dict (excludes sensitive information)
+    PUBLIC_FIELDS = (
+        'id', 'username', 'email', 'first_name', 'last_name', 'profile_image',
+        'is_active', 'last_login', 'theme', 'default_view',
+        'notifications_enabled', 'created_at'
+    )
+    
     def to_dict(self):
         """Convert to dictionary (excludes sensitive information)"""
+        return User.public_dict(self)
+    
+    @staticmethod
+    def public_dict(row):
+        """Build the public dictionary from a User or a PUBLIC_FIELDS row"""
+        last_login = row.last_login
+        created_at = row.created_at
         return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'profile_image': self.profile_image,
-            'is_active': self.is_active,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
-            'theme': self.theme,
-            'default_view': self.default_view,
-            'notifications_enabled': self.notifications_enabled,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'id': row.id,
+            'username': row.username,
+            'email': row.email,
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'profile_image': row.profile_image,
+            'is_active': row.is_active,
+            'last_login': last_login.isoformat() if last_login else None,
+            'theme': row.theme,
+            'default_view': row.default_view,
+            'notifications_enabled': row.notifications_enabled,
+            'created_at': created_at.isoformat() if created_at else None
         }
 
 class Session(Base):
     """Model representing a user session"""
     __tablename__ = 'sessions'
+    __table_args__ = (
+        Index('ix_sessions_token_expires', 'session_token', 'expires_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -93,433 +172,586 @@ class AccountManager:
     
     def __init__(self):
         """Initialize the account manager"""
+        self._password_hasher = None
+        if ARGON2_AVAILABLE:
+            self._password_hasher = PasswordHasher(
+                time_cost=2, memory_cost=64 * 1024, parallelism=2, type=Type.ID
+            )
+        
+        # Validated sessions: token -> (user_id, user_dict, expires_at, cached_at)
+        self._session_cache = OrderedDict()
+        self._session_cache_lock = threading.Lock()
+        
         self.initialize_admin_account()
+        
+        # Periodically remove expired sessions in the background
+        self._reaper_stop = threading.Event()
+        reaper_thread = threading.Thread(target=self._session_reaper_loop)
+        reaper_thread.daemon = True
+        reaper_thread.start()
     
-    def initialize_admin_account(self):
-        """Create an admin account if none exists"""
-        session = db_manager.get_session()
-        if not session:
-            logger.error("Failed to get database session")
+    def _session_reaper_loop(self):
+        """Purge expired sessions until the reaper is stopped"""
+        while not self._reaper_stop.wait(SESSION_PURGE_INTERVAL):
+            self.purge_expired_sessions()
+    
+    def stop_session_reaper(self):
+        """Stop the background expired-session reaper"""
+        self._reaper_stop.set()
+    
+    def _get_cached_session(self, session_token):
+        """Return the cached user dict for a token, or None on a miss"""
+        with self._session_cache_lock:
+            entry = self._session_cache.get(session_token)
+            if not entry:
+                return None
+            
+            user_id, user_dict, expires_at, cached_at = entry
+            if (time.monotonic() - cached_at > SESSION_CACHE_TTL or
+                    datetime.datetime.utcnow() >= expires_at):
+                del self._session_cache[session_token]
+                return None
+            
+            self._session_cache.move_to_end(session_token)
+            return dict(user_dict)
+    
+    def _cache_session(self, session_token, user_id, user_dict, expires_at):
+        """Store a validated session in the cache"""
+        with self._session_cache_lock:
+            self._session_cache[session_token] = (
+                user_id, dict(user_dict), expires_at, time.monotonic()
+            )
+            self._session_cache.move_to_end(session_token)
+            while len(self._session_cache) > SESSION_CACHE_SIZE:
+                self._session_cache.popitem(last=False)
+    
+    def _evict_cached_sessions(self, session_token=None, user_id=None):
+        """Drop cached sessions by token and/or by owning user"""
+        with self._session_cache_lock:
+            if session_token is not None:
+                self._session_cache.pop(session_token, None)
+            
+            if user_id is not None:
+                stale = [token for token, entry in self._session_cache.items()
+                         if entry[0] == user_id]
+                for token in stale:
+                    del self._session_cache[token]
+    
+    @contextmanager
+    def _db_session(self):
+        """Yield a database session (or None), rolling back on error and always closing it"""
+        db_session = db_manager.get_session()
+        if not db_session:
+            yield None
             return
         
         try:
-            # Check if we already have users
-            user_count = session.query(User).count()
-            if user_count > 0:
-                logger.info(f"Database already contains {user_count} users")
-                session.close()
-                return
-            
-            # Create admin user
-            admin_password = "admin123"  # In a real app, this would be a generated secure password
-            salt = secrets.token_hex(16)
-            password_hash = self._hash_password(admin_password, salt)
-            
-            admin_user = User(
-                username="admin",
-                email="admin@drivemanager.com",
-                password_hash=password_hash,
-                salt=salt,
-                first_name="Admin",
-                last_name="User",
-                is_active=True,
-                last_login=datetime.datetime.utcnow()
-            )
-            
-            session.add(admin_user)
-            session.commit()
-            logger.info("Created admin user account")
+            yield db_session
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.close()
+    
+    def purge_expired_sessions(self):
+        """Delete all expired sessions, returning the number removed"""
+        try:
+            with self._db_session() as db_session:
+                if not db_session:
+                    return 0
+                
+                purged = db_session.query(Session).filter(
+                    Session.expires_at < datetime.datetime.utcnow()
+                ).delete(synchronize_session=False)
+                db_session.commit()
+                
+                if purged:
+                    logger.info(f"Purged {purged} expired sessions")
+                return purged
         
         except Exception as e:
-            logger.error(f"Error creating admin account: {e}")
-            session.rollback()
+            logger.error(f"Error purging expired sessions: {e}")
+            return 0
+    
+    def initialize_admin_account(self):
+        """Create an admin account if none exists
         
-        finally:
-            session.close()
+        A cheap EXISTS check skips the password hash on normal startups; the
+        insert itself is an INSERT ... SELECT ... WHERE NOT EXISTS that ignores
+        unique-key conflicts, so concurrently starting workers cannot race.
+        """
+        try:
+            with self._db_session() as session:
+                if not session:
+                    logger.error("Failed to get database session")
+                    return
+                
+                if session.scalar(select(exists().select_from(User))):
+                    logger.info("Database already contains users")
+                    return
+                
+                # Create admin user
+                admin_password = "admin123"  # In a real app, this would be a generated secure password
+                salt = secrets.token_urlsafe(16)
+                password_hash = self._hash_password(admin_password, salt)
+                
+                admin_values = {
+                    'username': "admin",
+                    'email': "admin@drivemanager.com",
+                    'password_hash': password_hash,
+                    'salt': salt,
+                    'first_name': "Admin",
+                    'last_name': "User",
+                    'is_active': True,
+                    'last_login': datetime.datetime.utcnow()
+                }
+                
+                # Only insert while the users table is empty
+                admin_select = select(*[literal(value) for value in admin_values.values()]).where(
+                    ~exists().select_from(User)
+                )
+                
+                dialect = session.get_bind().dialect.name
+                insert_factory = _CONFLICT_INSERTS.get(dialect, insert)
+                stmt = insert_factory(User).from_select(list(admin_values), admin_select)
+                if dialect in _CONFLICT_INSERTS:
+                    stmt = stmt.on_conflict_do_nothing()
+                
+                result = session.execute(stmt)
+                session.commit()
+                
+                if result.rowcount:
+                    logger.info("Created admin user account")
+                else:
+                    logger.info("Database already contains users")
+        
+        except Exception as e:
+            logger.error(f"Error creating admin account: {e}")
     
     def _hash_password(self, password, salt):
         """Hash a password with the given salt"""
-        # In a real application, you'd use a more robust method like Argon2
+        # Argon2 embeds its own salt in the encoded hash; the salt column
+        # is only used by the PBKDF2 fallback when argon2-cffi is missing
+        if self._password_hasher:
+            return self._password_hasher.hash(password)
+        
+        return self._pbkdf2_hash_password(password, salt)
+    
+    def _pbkdf2_hash_password(self, password, salt, iterations=PBKDF2_ITERATIONS):
+        """Hash a password with PBKDF2-HMAC-SHA256"""
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations)
+        return f"{PBKDF2_HASH_PREFIX}{iterations}${digest.hex()}"
+    
+    def _blake2_hash_password(self, password, salt):
+        """Hash a password with the earlier keyed BLAKE2b scheme"""
+        hash_obj = hashlib.blake2b(password.encode('utf-8'), key=salt.encode('utf-8'), digest_size=32)
+        return BLAKE2_HASH_PREFIX + hash_obj.hexdigest()
+    
+    def _legacy_hash_password(self, password, salt):
+        """Hash a password with the legacy salted SHA-256 scheme"""
         hash_obj = hashlib.sha256((password + salt).encode())
         return hash_obj.hexdigest()
     
+    def _verify_password(self, user, password):
+        """Verify a password against a user's stored hash.
+        
+        Hashes made with an older scheme (or Argon2 hashes with outdated
+        parameters) are transparently upgraded on success; the caller
+        commits the change.
+        """
+        if user.password_hash.startswith('$argon2'):
+            if not self._password_hasher:
+                logger.error("Argon2 hash found but argon2-cffi is not installed")
+                return False
+            
+            try:
+                self._password_hasher.verify(user.password_hash, password)
+            except argon2_exceptions.VerificationError:
+                return False
+            except argon2_exceptions.InvalidHashError:
+                logger.error(f"Invalid password hash for user {user.id}")
+                return False
+            
+            needs_rehash = self._password_hasher.check_needs_rehash(user.password_hash)
+        else:
+            if user.password_hash.startswith(PBKDF2_HASH_PREFIX):
+                try:
+                    iterations = int(user.password_hash[len(PBKDF2_HASH_PREFIX):].split('$', 1)[0])
+                except ValueError:
+                    logger.error(f"Invalid password hash for user {user.id}")
+                    return False
+                hashed_attempt = self._pbkdf2_hash_password(password, user.salt, iterations)
+                needs_rehash = self._password_hasher is not None or iterations < PBKDF2_ITERATIONS
+            elif user.password_hash.startswith(BLAKE2_HASH_PREFIX):
+                hashed_attempt = self._blake2_hash_password(password, user.salt)
+                needs_rehash = True
+            else:
+                hashed_attempt = self._legacy_hash_password(password, user.salt)
+                needs_rehash = True
+            
+            if not hmac.compare_digest(hashed_attempt, user.password_hash):
+                return False
+        
+        if needs_rehash:
+            user.password_hash = self._hash_password(password, user.salt)
+        
+        return True
+    
     def register_user(self, username, email, password, first_name=None, last_name=None):
         """Register a new user"""
-        session = db_manager.get_session()
-        if not session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            # Validate input
-            if not self._validate_username(username):
-                return {"success": False, "error": "Invalid username. Use 3-20 characters, letters, numbers, and underscores only."}
-            
-            if not self._validate_email(email):
-                return {"success": False, "error": "Invalid email address."}
-            
-            if not self._validate_password(password):
-                return {"success": False, "error": "Password must be at least 8 characters long."}
-            
-            # Check if username or email already exists
-            existing_user = session.query(User).filter(
-                (User.username == username) | (User.email == email)
-            ).first()
-            
-            if existing_user:
-                if existing_user.username == username:
-                    return {"success": False, "error": "Username already taken."}
-                else:
-                    return {"success": False, "error": "Email already registered."}
-            
-            # Create the user
-            salt = secrets.token_hex(16)
-            password_hash = self._hash_password(password, salt)
-            
-            new_user = User(
-                username=username,
-                email=email,
-                password_hash=password_hash,
-                salt=salt,
-                first_name=first_name,
-                last_name=last_name,
-                is_active=True
-            )
-            
-            session.add(new_user)
-            session.commit()
-            
-            return {
-                "success": True, 
-                "message": "User registered successfully", 
-                "user_id": new_user.id
-            }
+            with self._db_session() as session:
+                if not session:
+                    return {"success": False, "error": "Database error"}
+                
+                # Validate input in one pass; only re-check field by field
+                # to pick the error message when something is invalid. The
+                # fused match is only sound for strings free of the separator.
+                fields = (username, email, password)
+                fused_ok = (
+                    all(isinstance(field, str) and '\x00' not in field for field in fields)
+                    and _REGISTRATION_RE.match('\x00'.join(fields))
+                )
+                if not fused_ok:
+                    if not self._validate_username(username):
+                        return {"success": False, "error": "Invalid username. Use 3-20 characters, letters, numbers, and underscores only."}
+                    
+                    if not self._validate_email(email):
+                        return {"success": False, "error": "Invalid email address."}
+                    
+                    if not self._validate_password(password):
+                        return {"success": False, "error": "Password must be at least 8 characters long."}
+                
+                # Check if username or email already exists
+                existing_user = session.query(User).filter(
+                    (User.username == username) | (User.email == email)
+                ).first()
+                
+                if existing_user:
+                    if existing_user.username == username:
+                        return {"success": False, "error": "Username already taken."}
+                    else:
+                        return {"success": False, "error": "Email already registered."}
+                
+                # Create the user
+                salt = secrets.token_urlsafe(16)
+                password_hash = self._hash_password(password, salt)
+                
+                new_user = User(
+                    username=username,
+                    email=email,
+                    password_hash=password_hash,
+                    salt=salt,
+                    first_name=first_name,
+                    last_name=last_name,
+                    is_active=True
+                )
+                
+                session.add(new_user)
+                session.commit()
+                
+                return {
+                    "success": True, 
+                    "message": "User registered successfully", 
+                    "user_id": new_user.id
+                }
         
         except Exception as e:
             logger.error(f"Error registering user: {e}")
-            session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            session.close()
     
     def login(self, username_or_email, password, ip_address=None, user_agent=None):
         """Log in a user and create a session"""
-        session = db_manager.get_session()
-        if not session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            # Find the user
-            user = session.query(User).filter(
-                ((User.username == username_or_email) | (User.email == username_or_email)) &
-                (User.is_active == True)
-            ).first()
-            
-            if not user:
-                return {"success": False, "error": "Invalid username/email or password."}
-            
-            # Verify password
-            hashed_attempt = self._hash_password(password, user.salt)
-            if hashed_attempt != user.password_hash:
-                return {"success": False, "error": "Invalid username/email or password."}
-            
-            # Update last login time
-            user.last_login = datetime.datetime.utcnow()
-            
-            # Create a new session
-            session_token = secrets.token_hex(32)
-            expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=7)  # Session valid for 7 days
-            
-            user_session = Session(
-                user_id=user.id,
-                session_token=session_token,
-                expires_at=expires_at,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-            
-            session.add(user_session)
-            session.commit()
-            
-            return {
-                "success": True,
-                "message": "Login successful",
-                "user": user.to_dict(),
-                "session_token": session_token,
-                "expires_at": expires_at.isoformat()
-            }
+            with self._db_session() as session:
+                if not session:
+                    return {"success": False, "error": "Database error"}
+                
+                # Find the user; usernames cannot contain '@', so a single
+                # equality lookup on the right column is enough
+                column = User.email if '@' in username_or_email else User.username
+                user = session.query(User).filter(
+                    column == username_or_email,
+                    User.is_active == True
+                ).first()
+                
+                if not user:
+                    return {"success": False, "error": "Invalid username/email or password."}
+                
+                # Verify password
+                if not self._verify_password(user, password):
+                    return {"success": False, "error": "Invalid username/email or password."}
+                
+                # Update last login time
+                user.last_login = datetime.datetime.utcnow()
+                
+                # Create a new session
+                session_token = secrets.token_urlsafe(32)
+                expires_at = datetime.datetime.utcnow() + datetime.timedelta(days=7)  # Session valid for 7 days
+                
+                # Core insert: the row is never used as an ORM object here
+                session.execute(insert(Session).values(
+                    user_id=user.id,
+                    session_token=session_token,
+                    expires_at=expires_at,
+                    ip_address=ip_address,
+                    user_agent=user_agent
+                ))
+                session.commit()
+                
+                return {
+                    "success": True,
+                    "message": "Login successful",
+                    "user": user.to_dict(),
+                    "session_token": session_token,
+                    "expires_at": expires_at.isoformat()
+                }
         
         except Exception as e:
             logger.error(f"Error during login: {e}")
-            session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            session.close()
     
     def validate_session(self, session_token):
         """Validate a user session"""
         if not session_token:
             return {"success": False, "error": "No session token provided."}
         
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
+        cached_user = self._get_cached_session(session_token)
+        if cached_user:
+            return {"success": True, "user": cached_user}
         
         try:
-            # Find the session
-            user_session = db_session.query(Session).filter_by(session_token=session_token).first()
-            
-            if not user_session:
-                return {"success": False, "error": "Invalid session."}
-            
-            # Check if session is expired
-            if not user_session.is_valid():
-                return {"success": False, "error": "Session expired."}
-            
-            # Check if user is still active
-            if not user_session.user.is_active:
-                return {"success": False, "error": "User account is inactive."}
-            
-            return {
-                "success": True,
-                "user": user_session.user.to_dict()
-            }
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                # Find the session, fetching its user in the same round-trip
+                user_session = db_session.query(Session).options(
+                    joinedload(Session.user)
+                ).filter(Session.session_token == session_token).first()
+                
+                if not user_session:
+                    return {"success": False, "error": "Invalid session."}
+                
+                # Check if session is expired
+                if not user_session.is_valid():
+                    return {"success": False, "error": "Session expired."}
+                
+                # Check if user is still active
+                if not user_session.user.is_active:
+                    return {"success": False, "error": "User account is inactive."}
+                
+                user_dict = user_session.user.to_dict()
+                self._cache_session(session_token, user_session.user_id, user_dict, user_session.expires_at)
+                
+                return {
+                    "success": True,
+                    "user": user_dict
+                }
         
         except Exception as e:
             logger.error(f"Error validating session: {e}")
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
     
     def logout(self, session_token):
         """Log out a user by invalidating their session"""
         if not session_token:
             return {"success": False, "error": "No session token provided."}
         
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
+        self._evict_cached_sessions(session_token=session_token)
         
         try:
-            # Find and delete the session
-            user_session = db_session.query(Session).filter_by(session_token=session_token).first()
-            
-            if user_session:
-                db_session.delete(user_session)
-                db_session.commit()
-            
-            return {"success": True, "message": "Logged out successfully."}
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                # Find and delete the session
+                user_session = db_session.query(Session).filter_by(session_token=session_token).first()
+                
+                if user_session:
+                    db_session.delete(user_session)
+                    db_session.commit()
+                
+                return {"success": True, "message": "Logged out successfully."}
         
         except Exception as e:
             logger.error(f"Error during logout: {e}")
-            db_session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
     
     def get_user_profile(self, user_id):
         """Get a user's profile"""
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            user = db_session.query(User).filter_by(id=user_id).first()
-            
-            if not user:
-                return {"success": False, "error": "User not found."}
-            
-            return {"success": True, "user": user.to_dict()}
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                user = db_session.query(User).filter_by(id=user_id).first()
+                
+                if not user:
+                    return {"success": False, "error": "User not found."}
+                
+                return {"success": True, "user": user.to_dict()}
         
         except Exception as e:
             logger.error(f"Error getting user profile: {e}")
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
     
     def update_user_profile(self, user_id, profile_data):
         """Update a user's profile"""
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            user = db_session.query(User).filter_by(id=user_id).first()
-            
-            if not user:
-                return {"success": False, "error": "User not found."}
-            
-            # Fields that can be updated
-            allowed_fields = [
-                'first_name', 'last_name', 'profile_image', 
-                'theme', 'default_view', 'notifications_enabled'
-            ]
-            
-            # Update allowed fields
-            for field in allowed_fields:
-                if field in profile_data:
-                    setattr(user, field, profile_data[field])
-            
-            db_session.commit()
-            
-            return {
-                "success": True, 
-                "message": "Profile updated successfully",
-                "user": user.to_dict()
-            }
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                user = db_session.query(User).filter_by(id=user_id).first()
+                
+                if not user:
+                    return {"success": False, "error": "User not found."}
+                
+                # Update allowed fields
+                for field, value in profile_data.items():
+                    if field in _PROFILE_FIELDS:
+                        setattr(user, field, value)
+                
+                db_session.commit()
+                self._evict_cached_sessions(user_id=user_id)
+                
+                return {
+                    "success": True, 
+                    "message": "Profile updated successfully",
+                    "user": user.to_dict()
+                }
         
         except Exception as e:
             logger.error(f"Error updating user profile: {e}")
-            db_session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
     
     def change_password(self, user_id, current_password, new_password):
         """Change a user's password"""
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            user = db_session.query(User).filter_by(id=user_id).first()
-            
-            if not user:
-                return {"success": False, "error": "User not found."}
-            
-            # Verify current password
-            hashed_attempt = self._hash_password(current_password, user.salt)
-            if hashed_attempt != user.password_hash:
-                return {"success": False, "error": "Current password is incorrect."}
-            
-            # Validate new password
-            if not self._validate_password(new_password):
-                return {"success": False, "error": "New password must be at least 8 characters long."}
-            
-            # Update password
-            salt = secrets.token_hex(16)
-            password_hash = self._hash_password(new_password, salt)
-            
-            user.password_hash = password_hash
-            user.salt = salt
-            
-            # Invalidate all existing sessions
-            sessions = db_session.query(Session).filter_by(user_id=user_id).all()
-            for session in sessions:
-                db_session.delete(session)
-            
-            db_session.commit()
-            
-            return {"success": True, "message": "Password changed successfully."}
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                user = db_session.query(User).filter_by(id=user_id).first()
+                
+                if not user:
+                    return {"success": False, "error": "User not found."}
+                
+                # Verify current password
+                if not self._verify_password(user, current_password):
+                    return {"success": False, "error": "Current password is incorrect."}
+                
+                # Validate new password
+                if not self._validate_password(new_password):
+                    return {"success": False, "error": "New password must be at least 8 characters long."}
+                
+                # Update password
+                salt = secrets.token_urlsafe(16)
+                password_hash = self._hash_password(new_password, salt)
+                
+                user.password_hash = password_hash
+                user.salt = salt
+                
+                # Invalidate all existing sessions
+                db_session.query(Session).filter_by(user_id=user_id).delete(synchronize_session=False)
+                
+                db_session.commit()
+                self._evict_cached_sessions(user_id=user_id)
+                
+                return {"success": True, "message": "Password changed successfully."}
         
         except Exception as e:
             logger.error(f"Error changing password: {e}")
-            db_session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
     
     def _validate_username(self, username):
         """Validate a username"""
-        if not username:
+        if not username or not isinstance(username, str):
             return False
         
-        # Username should be 3-20 characters, letters, numbers, and underscores only
-        pattern = r'^[a-zA-Z0-9_]{3,20}$'
-        return bool(re.match(pattern, username))
+        return bool(_USERNAME_RE.match(username))
     
     def _validate_email(self, email):
         """Validate an email address"""
-        if not email:
+        if not email or not isinstance(email, str):
             return False
         
-        # Simple email validation
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email))
+        return bool(_EMAIL_RE.match(email))
     
     def _validate_password(self, password):
         """Validate a password"""
         # Minimum 8 characters
-        return password and len(password) >= 8
+        return isinstance(password, str) and len(password) >= 8
     
-    def get_all_users(self):
-        """Get all users (admin function)"""
-        db_session = db_manager.get_session()
-        if not db_session:
-            return []
-        
+    def get_all_users(self, offset=0, limit=USER_STREAM_BATCH_SIZE):
+        """Get a page of users as dictionaries, ordered by id; limit=None returns all (admin function)"""
         try:
-            users = db_session.query(User).all()
-            return [user.to_dict() for user in users]
+            with self._db_session() as db_session:
+                if not db_session:
+                    return []
+                
+                # Project only the public columns to skip full ORM hydration,
+                # and fetch rows in batches; the session is closed before returning
+                columns = [getattr(User, field) for field in User.PUBLIC_FIELDS]
+                query = db_session.query(*columns).order_by(User.id).offset(offset)
+                if limit is not None:
+                    query = query.limit(limit)
+                
+                return [User.public_dict(row) for row in query.yield_per(USER_STREAM_BATCH_SIZE)]
         
         except Exception as e:
             logger.error(f"Error getting all users: {e}")
             return []
-        
-        finally:
-            db_session.close()
     
     def deactivate_user(self, user_id):
         """Deactivate a user account"""
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            user = db_session.query(User).filter_by(id=user_id).first()
-            
-            if not user:
-                return {"success": False, "error": "User not found."}
-            
-            user.is_active = False
-            
-            # Invalidate all existing sessions
-            sessions = db_session.query(Session).filter_by(user_id=user_id).all()
-            for session in sessions:
-                db_session.delete(session)
-            
-            db_session.commit()
-            
-            return {"success": True, "message": "User account deactivated."}
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                user = db_session.query(User).filter_by(id=user_id).first()
+                
+                if not user:
+                    return {"success": False, "error": "User not found."}
+                
+                user.is_active = False
+                
+                # Invalidate all existing sessions
+                db_session.query(Session).filter_by(user_id=user_id).delete(synchronize_session=False)
+                
+                db_session.commit()
+                self._evict_cached_sessions(user_id=user_id)
+                
+                return {"success": True, "message": "User account deactivated."}
         
         except Exception as e:
             logger.error(f"Error deactivating user: {e}")
-            db_session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
     
     def reactivate_user(self, user_id):
         """Reactivate a user account"""
-        db_session = db_manager.get_session()
-        if not db_session:
-            return {"success": False, "error": "Database error"}
-        
         try:
-            user = db_session.query(User).filter_by(id=user_id).first()
-            
-            if not user:
-                return {"success": False, "error": "User not found."}
-            
-            user.is_active = True
-            db_session.commit()
-            
-            return {"success": True, "message": "User account reactivated."}
+            with self._db_session() as db_session:
+                if not db_session:
+                    return {"success": False, "error": "Database error"}
+                
+                user = db_session.query(User).filter_by(id=user_id).first()
+                
+                if not user:
+                    return {"success": False, "error": "User not found."}
+                
+                user.is_active = True
+                db_session.commit()
+                
+                return {"success": True, "message": "User account reactivated."}
         
         except Exception as e:
             logger.error(f"Error reactivating user: {e}")
-            db_session.rollback()
             return {"success": False, "error": "An unexpected error occurred."}
-        
-        finally:
-            db_session.close()
 
-# Singleton instance
-account_manager = AccountManager()
\ No newline at end of file
+@functools.lru_cache(maxsize=1)
+def get_account_manager():
+    """Return the shared AccountManager, creating it on first use"""
+    return AccountManager()
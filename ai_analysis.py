@@ -7,14 +7,35 @@ import os
 import io
 import json
 import datetime
-import random
 import hashlib
 import logging
 import time
+import mmap
+import numpy as np
+import functools
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import insert, update
 from database import db_manager
 from models import Base, File, Tag, Recommendation, OllamaModelCache
 
+# Optional imports - will be used if available
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,23 +53,236 @@ TIER1_MODELS = ["tinybert", "fasttagger", "smallanalyzer"]  # Lightweight local
 TIER2_MODELS = ["bert-base", "file-analyzer", "tag-generator-large"]  # Remote laptop models
 TIER3_MODELS = ["gpt-4o", "claude-3", "gemini-pro"]  # External API models
 
+# Stored analyses from lower tiers are preferred; rows from other models are ignored
+_ANALYSIS_MODEL_RANK = {
+    model: rank for rank, models in enumerate((TIER1_MODELS, TIER2_MODELS, TIER3_MODELS)) for model in models
+}
+
+# Number of files analyzed concurrently by analyze_directory
+ANALYSIS_MAX_WORKERS = 32
+
+# Endpoint availability is re-probed once the last check is older than this (seconds)
+ENDPOINT_RECHECK_INTERVAL = 60
+
+# A tier is skipped for CIRCUIT_BREAKER_COOLDOWN seconds after this many consecutive failures
+CIRCUIT_BREAKER_THRESHOLD = 3
+CIRCUIT_BREAKER_COOLDOWN = 30
+
+# Maximum number of files sent in one request to an endpoint's batch route
+ANALYSIS_BATCH_SIZE = 32
+
+# Limits for the in-memory analysis cache
+ANALYSIS_CACHE_MAX_ENTRIES = 10000
+ANALYSIS_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# Seconds before retrying the tiers for a file that all of them failed on
+FAILED_ANALYSIS_TTL = 300
+
+# File hashing for the analysis cache
+HASH_CHUNK_SIZE = 1024 * 1024  # Size of each sampled chunk
+HASH_SAMPLE_THRESHOLD = 3 * HASH_CHUNK_SIZE  # Larger files are sampled, not hashed in full
+HASH_SAMPLE_SPACING = 64 * 1024 * 1024  # One extra sample per this many bytes
+HASH_MAX_SAMPLES = 16
+
+# Lookup tables for file extensions
+CONTENT_TYPES = {
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.mp3': 'audio/mpeg',
+    '.mp4': 'video/mp4',
+    '.avi': 'video/x-msvideo',
+    '.zip': 'application/zip',
+    '.txt': 'text/plain',
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.xml': 'application/xml',
+    '.py': 'text/x-python',
+    '.c': 'text/x-c',
+    '.cpp': 'text/x-c++',
+    '.java': 'text/x-java',
+}
+
+PROGRAMMING_LANGUAGES = {
+    '.py': 'Python',
+    '.js': 'JavaScript',
+    '.html': 'HTML',
+    '.css': 'CSS',
+    '.java': 'Java',
+    '.cpp': 'C++',
+    '.c': 'C',
+    '.go': 'Go',
+    '.rb': 'Ruby',
+    '.php': 'PHP',
+    '.ts': 'TypeScript',
+    '.swift': 'Swift',
+    '.kt': 'Kotlin',
+    '.rs': 'Rust'
+}
+
+TEXT_EXTENSIONS = frozenset([
+    '.txt', '.md', '.html', '.css', '.js', '.py', '.java', '.c', '.cpp',
+    '.h', '.json', '.xml', '.csv', '.log', '.sh', '.bat', '.ps1', '.yaml',
+    '.yml', '.ini', '.cfg', '.conf', '.php', '.rb', '.ts', '.go', '.rs'
+])
+
+# Extensions known to be binary, so _is_text_file can skip sniffing their contents
+_BINARY_EXTENSIONS = frozenset([
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp', '.ico',
+    '.mp3', '.wav', '.flac', '.ogg', '.aac', '.m4a',
+    '.mp4', '.avi', '.mov', '.mkv', '.wmv', '.webm',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.tar',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.exe', '.dll', '.so', '.dylib', '.bin', '.iso', '.apk', '.jar', '.class', '.pyc',
+    '.db', '.sqlite'
+])
+
+# Suggested tags by file extension
+_EXT_TAGS = {
+    '.pdf': ('document', 'report', 'reading'),
+    '.docx': ('document', 'writing', 'work'),
+    '.xlsx': ('spreadsheet', 'data', 'finance'),
+    '.pptx': ('presentation', 'slides', 'meeting'),
+    '.jpg': ('image', 'photo', 'visual'),
+    '.png': ('image', 'graphic', 'screenshot'),
+    '.mp3': ('audio', 'music', 'sound'),
+    '.mp4': ('video', 'movie', 'media'),
+    '.zip': ('archive', 'compressed', 'backup'),
+    '.py': ('code', 'python', 'development'),
+    '.js': ('code', 'javascript', 'web'),
+    '.html': ('code', 'web', 'frontend'),
+    '.css': ('code', 'web', 'style')
+}
+_DEFAULT_TAGS = ('file', 'document', 'data')
+
+# Fields of _generate_basic_analysis, which is built from file metadata alone
+_BASIC_ANALYSIS_KEYS = frozenset(['filename', 'extension', 'size', 'content_type', 'suggested_tags', 'timestamp'])
+
+# Bytes that don't count as printable text when sniffing file contents
+_NON_PRINTABLE_BYTES = bytes(b for b in range(256) if not (32 <= b <= 126 or b in b'\n\r\t'))
+
+# Mock analysis kind by file extension
+_MOCK_DOCUMENT_TYPES = {
+    '.pdf': 'text', '.docx': 'text', '.txt': 'text',
+    '.jpg': 'image', '.png': 'image', '.gif': 'image',
+    '.mp3': 'audio', '.wav': 'audio', '.flac': 'audio',
+    '.mp4': 'video', '.avi': 'video', '.mov': 'video',
+    '.py': 'code', '.js': 'code', '.html': 'code', '.css': 'code', '.java': 'code', '.cpp': 'code'
+}
+
+# Value pools for mock analyses
+_MOCK_RNG = np.random.default_rng()
+_MOCK_LANGUAGES = ('English', 'Spanish', 'French', 'German')
+_MOCK_COLOR_PROFILES = ('RGB', 'CMYK', 'Grayscale')
+_MOCK_BITRATES = (128, 192, 256, 320)
+_MOCK_CHANNELS = ('Mono', 'Stereo')
+_MOCK_RESOLUTIONS = ('720p', '1080p', '4K')
+_MOCK_FRAME_RATES = (24, 30, 60)
+
+def _mock_draw(low, high):
+    """Draw one random int per field in a single call, with inclusive bounds"""
+    return _MOCK_RNG.integers(low, high, endpoint=True).tolist()
+
+@functools.lru_cache(maxsize=4096)
+def _file_extension(name):
+    """Get the lowercased extension of a file name or path"""
+    return os.path.splitext(name)[1].lower()
+
+def _json_dumps(obj):
+    """Serialize to UTF-8 JSON bytes, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str).encode()
+
+def _json_loads(data):
+    """Parse JSON from bytes or str, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _is_basic_analysis(analysis):
+    """Check whether an analysis holds only the fields of the metadata-only fallback"""
+    return analysis.keys() <= _BASIC_ANALYSIS_KEYS
+
+def _best_stored_analysis(rows):
+    """Pick the analysis to reuse from (model_name, id, result_data) cache rows for one file"""
+    # Lowest tier first, newest first within a tier; metadata-only placeholders
+    # stored by older versions never shadow a real result
+    for _, _, result_data in sorted(rows, key=lambda row: (_ANALYSIS_MODEL_RANK[row[0]], -row[1])):
+        if result_data:
+            analysis = _json_loads(result_data)
+            if not _is_basic_analysis(analysis):
+                return analysis
+    return None
+
+def _new_file_hasher():
+    """Create a fast non-cryptographic hasher for file fingerprints"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64()
+    return hashlib.blake2b(digest_size=16)
+
 class AIAnalysisManager:
     """Manager for AI file analysis functionality using a tiered approach"""
     
     def __init__(self):
         self.analysis_results = {}
-        self.analysis_cache = {}
+        
+        # LRU of analyses by file hash, bounded by entry count and approximate size
+        self.analysis_cache = OrderedDict()
+        self._analysis_cache_bytes = 0
+        
+        # path -> (stat fingerprint, file hash), to skip rehashing unchanged files
+        self.file_hashes = {}
+        
+        # file hash -> monotonic time after which a failed file may be retried
+        self.failed_analyses = {}
+        
+        # Guards the caches above, which are shared by analyze_directory workers
+        self._cache_lock = threading.Lock()
+        
+        # Reuse keep-alive connections to the analysis endpoints across calls
+        # and workers. Transient read/5xx errors are retried; unreachable
+        # hosts are not, since the tier circuit breaker handles those.
+        self.session = requests.Session()
+        self.session.headers['Connection'] = 'keep-alive'
+        adapter = HTTPAdapter(
+            pool_connections=ANALYSIS_MAX_WORKERS,
+            pool_maxsize=2 * ANALYSIS_MAX_WORKERS,
+            max_retries=Retry(total=2, connect=0, backoff_factor=0.1, status_forcelist=(502, 503, 504))
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Probe the endpoints in parallel so startup waits for the slowest one only
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tier1_available, tier2_available = executor.map(
+                self._check_endpoint_available, [LOCAL_ANALYSIS_ENDPOINT, REMOTE_ANALYSIS_ENDPOINT]
+            )
+        checked_at = time.monotonic()
         
         # Track the available endpoints
         self.endpoints = {
             "tier1": {
                 "url": LOCAL_ANALYSIS_ENDPOINT,
-                "available": self._check_endpoint_available(LOCAL_ANALYSIS_ENDPOINT),
+                "available": tier1_available,
+                "checked_at": checked_at,
+                "failures": 0,
+                "open_until": 0,
                 "models": TIER1_MODELS
             },
             "tier2": {
                 "url": REMOTE_ANALYSIS_ENDPOINT,
-                "available": self._check_endpoint_available(REMOTE_ANALYSIS_ENDPOINT),
+                "available": tier2_available,
+                "checked_at": checked_at,
+                "failures": 0,
+                "open_until": 0,
                 "models": TIER2_MODELS,
                 "learning_enabled": True
             },
@@ -62,81 +296,210 @@ class AIAnalysisManager:
     def _check_endpoint_available(self, url):
         """Check if an endpoint is available"""
         try:
-            response = requests.get(f"{url}/status", timeout=2)
+            response = self.session.get(f"{url}/status", timeout=2)
             return response.status_code == 200
         except Exception:
             return False
+    
+    def _is_available(self, tier):
+        """Check if a tier can be used, re-probing its endpoint once the last check is stale"""
+        endpoint = self.endpoints[tier]
+        if not endpoint["url"]:
+            return endpoint["available"]
+        
+        now = time.monotonic()
+        
+        # Circuit breaker is open after repeated failures
+        if now < endpoint["open_until"]:
+            return False
+        
+        if now - endpoint["checked_at"] > ENDPOINT_RECHECK_INTERVAL:
+            # Mark as checked first so concurrent workers don't all re-probe
+            endpoint["checked_at"] = now
+            endpoint["available"] = self._check_endpoint_available(endpoint["url"])
+        
+        return endpoint["available"]
+    
+    def _record_tier_result(self, tier, success):
+        """Track consecutive failures for a tier, opening its circuit breaker when they pile up"""
+        endpoint = self.endpoints[tier]
+        if success:
+            endpoint["failures"] = 0
+            return
+        
+        endpoint["failures"] += 1
+        if endpoint["failures"] >= CIRCUIT_BREAKER_THRESHOLD:
+            logger.warning(f"Skipping {tier} for {CIRCUIT_BREAKER_COOLDOWN}s after {endpoint['failures']} failures")
+            endpoint["failures"] = 0
+            endpoint["open_until"] = time.monotonic() + CIRCUIT_BREAKER_COOLDOWN
         
     def _calculate_file_hash(self, file_path):
         """Calculate a hash for a file to check for cached analysis results"""
         try:
             if not os.path.exists(file_path):
                 return None
-                
-            # For small files, use the entire file
-            if os.path.getsize(file_path) < 10 * 1024 * 1024:  # 10MB
-                with open(file_path, 'rb') as f:
-                    file_hash = hashlib.md5(f.read()).hexdigest()
-                return file_hash
             
-            # For larger files, sample the beginning, middle, and end
+            # The hash is content-only so it stays valid across touch and copy;
+            # stat metadata is only used by _get_file_hash's in-memory shortcut
+            stat = os.stat(file_path)
+            hasher = _new_file_hasher()
+            
+            if stat.st_size == 0:
+                return hasher.hexdigest()
+            
             with open(file_path, 'rb') as f:
-                # Read first 1MB
-                beginning = f.read(1024 * 1024)
-                
-                # Go to the middle and read 1MB
-                f.seek(os.path.getsize(file_path) // 2)
-                middle = f.read(1024 * 1024)
+                # For small files, stream the entire file through a fixed-size buffer
+                if stat.st_size <= HASH_SAMPLE_THRESHOLD:
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    return hashlib.file_digest(f, lambda: hasher).hexdigest()
                 
-                # Go to the end (minus 1MB) and read 1MB
-                f.seek(-1024 * 1024, 2)
-                end = f.read(1024 * 1024)
-                
-                # Combine samples and hash
-                file_hash = hashlib.md5(beginning + middle + end).hexdigest()
-                
-            return file_hash
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    size = len(view)
+                    
+                    # Samples don't cover every byte, so include the length too
+                    hasher.update(f"{size}:".encode())
+                    
+                    # For larger files, sample evenly spaced chunks from the
+                    # beginning through the end, adding more samples as size grows
+                    sample_count = min(HASH_MAX_SAMPLES, 3 + size // HASH_SAMPLE_SPACING)
+                    last_offset = size - HASH_CHUNK_SIZE
+                    offsets = [last_offset * i // (sample_count - 1) for i in range(sample_count)]
+                    
+                    # Queue read-ahead for every sample up front so the kernel
+                    # fetches them concurrently instead of one page fault at a time
+                    if hasattr(os, 'posix_fadvise'):
+                        for offset in offsets:
+                            os.posix_fadvise(f.fileno(), offset, HASH_CHUNK_SIZE, os.POSIX_FADV_WILLNEED)
+                    
+                    for offset in offsets:
+                        hasher.update(view[offset:offset + HASH_CHUNK_SIZE])
+            
+            return hasher.hexdigest()
         except Exception as e:
             logger.error(f"Error calculating file hash: {e}")
             return None
     
-    def analyze_file(self, file_metadata):
-        """Analyze a single file and extract information using tiered approach"""
+    def _get_file_hash(self, file_path):
+        """Get a file's hash, only rereading the file if its stat fingerprint changed"""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        
+        fingerprint = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._cache_lock:
+            cached = self.file_hashes.get(file_path)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        
+        file_hash = self._calculate_file_hash(file_path)
+        if file_hash:
+            with self._cache_lock:
+                self.file_hashes[file_path] = (fingerprint, file_hash)
+        return file_hash
+    
+    def _get_cached_analysis(self, file_hash):
+        """Get an analysis from the in-memory cache, marking it recently used"""
+        with self._cache_lock:
+            entry = self.analysis_cache.get(file_hash)
+            if entry is None:
+                return None
+            self.analysis_cache.move_to_end(file_hash)
+            return entry[0]
+    
+    def _cache_analysis(self, file_hash, analysis):
+        """Add an analysis to the in-memory cache, evicting least recently used entries"""
+        size = len(_json_dumps(analysis))
+        with self._cache_lock:
+            previous = self.analysis_cache.pop(file_hash, None)
+            if previous:
+                self._analysis_cache_bytes -= previous[1]
+            
+            self.analysis_cache[file_hash] = (analysis, size)
+            self._analysis_cache_bytes += size
+            
+            while (len(self.analysis_cache) > ANALYSIS_CACHE_MAX_ENTRIES or
+                    self._analysis_cache_bytes > ANALYSIS_CACHE_MAX_BYTES):
+                _, (_, evicted_size) = self.analysis_cache.popitem(last=False)
+                self._analysis_cache_bytes -= evicted_size
+    
+    def _recently_failed(self, file_hash):
+        """Check if every tier failed on a file within the last FAILED_ANALYSIS_TTL seconds"""
+        with self._cache_lock:
+            retry_at = self.failed_analyses.get(file_hash)
+            if retry_at is None:
+                return False
+            if time.monotonic() < retry_at:
+                return True
+            del self.failed_analyses[file_hash]
+            return False
+    
+    def _record_failed_analysis(self, file_hash):
+        """Remember that every tier failed on a file so it isn't retried until the TTL passes"""
+        now = time.monotonic()
+        with self._cache_lock:
+            if len(self.failed_analyses) >= ANALYSIS_CACHE_MAX_ENTRIES:
+                self.failed_analyses = {h: t for h, t in self.failed_analyses.items() if t > now}
+            self.failed_analyses[file_hash] = now + FAILED_ANALYSIS_TTL
+    
+    def analyze_file(self, file_metadata, timestamp=None, pending_writes=None):
+        """Analyze a single file and extract information using tiered approach
+        
+        If pending_writes is a list, cache writes are appended to it for the
+        caller to store in one transaction instead of being written here.
+        """
         # Check if we have cached results
-        file_hash = self._calculate_file_hash(file_metadata.path)
-        if file_hash and file_hash in self.analysis_cache:
-            logger.info(f"Using cached analysis for {file_metadata.name}")
-            return self.analysis_cache[file_hash]
+        file_hash = self._get_file_hash(file_metadata.path)
+        if file_hash:
+            cached_analysis = self._get_cached_analysis(file_hash)
+            if cached_analysis is not None:
+                logger.info(f"Using cached analysis for {file_metadata.name}")
+                return cached_analysis
+            
+            # Fall back to the persistent cache, which survives restarts
+            stored_analysis = self._lookup_cache(file_hash)
+            if stored_analysis is not None:
+                logger.info(f"Using stored analysis for {file_metadata.name}")
+                self._cache_analysis(file_hash, stored_analysis)
+                return stored_analysis
+            
+            # Don't hit the tiers again for a file they all just failed on
+            if self._recently_failed(file_hash):
+                return self._generate_basic_analysis(file_metadata, timestamp)
         
         # Check if file exists and is accessible
         if not os.path.exists(file_metadata.path) or not os.access(file_metadata.path, os.R_OK):
             logger.warning(f"File {file_metadata.path} does not exist or is not readable")
-            return self._generate_basic_analysis(file_metadata)
+            return self._generate_basic_analysis(file_metadata, timestamp)
         
         # Try to analyze with tiered approach
         analysis = None
+        model_name = None
         
         # Tier 1: Local lightweight analysis
-        if self.endpoints["tier1"]["available"]:
+        if self._is_available("tier1"):
             logger.info(f"Using Tier 1 analysis for {file_metadata.name}")
+            model_name = self.endpoints["tier1"]["models"][0]  # Use first available model
             analysis = self._analyze_with_endpoint(
                 self.endpoints["tier1"]["url"], 
                 file_metadata, 
-                self.endpoints["tier1"]["models"][0]  # Use first available model
+                model_name,
+                timestamp
             )
+            self._record_tier_result("tier1", analysis is not None)
         
         # Tier 2: Remote laptop service with learning
-        if not analysis and self.endpoints["tier2"]["available"]:
+        if not analysis and self._is_available("tier2"):
             logger.info(f"Using Tier 2 analysis for {file_metadata.name}")
+            model_name = self.endpoints["tier2"]["models"][0]  # Use first available model
             analysis = self._analyze_with_endpoint(
                 self.endpoints["tier2"]["url"], 
                 file_metadata,
-                self.endpoints["tier2"]["models"][0]  # Use first available model
+                model_name,
+                timestamp
             )
-            
-            # If analysis succeeded and learning is enabled, store results
-            if analysis and self.endpoints["tier2"]["learning_enabled"]:
-                self._store_analysis_in_cache(file_metadata, analysis, file_hash)
+            self._record_tier_result("tier2", analysis is not None)
         
         # Tier 3: External API (OpenAI, etc.)
         if not analysis:
@@ -144,77 +507,112 @@ class AIAnalysisManager:
             try:
                 api_key = os.environ.get("OPENAI_API_KEY")
                 if api_key:
+                    model_name = "gpt-4o"
                     analysis = self._analyze_with_openai(file_metadata, api_key)
             except Exception as e:
                 logger.error(f"Error using OpenAI for analysis: {e}")
         
-        # Fallback to basic analysis if all tiers failed
+        # Persist successful tier results so they survive restarts
+        if analysis and file_hash:
+            if pending_writes is not None:
+                pending_writes.append((file_metadata, analysis, file_hash, model_name))
+            else:
+                self._store_analysis_in_cache(file_metadata, analysis, file_hash, model_name)
+        
+        # Fallback to basic analysis if all tiers failed; it is not cached,
+        # so the tiers are tried again once the failure expires
         if not analysis:
             logger.warning(f"All tiers failed, using basic analysis for {file_metadata.name}")
-            analysis = self._generate_basic_analysis(file_metadata)
+            if file_hash:
+                self._record_failed_analysis(file_hash)
+            return self._generate_basic_analysis(file_metadata, timestamp)
         
         # Cache the result
         if file_hash:
-            self.analysis_cache[file_hash] = analysis
+            self._cache_analysis(file_hash, analysis)
             
         return analysis
     
-    def _analyze_with_endpoint(self, endpoint_url, file_metadata, model_name):
+    def _build_endpoint_payload(self, file_metadata, model_name):
+        """Build the request payload describing a file for an analysis endpoint"""
+        # For text files: Read content and send it
+        if self._is_text_file(file_metadata.path):
+            with open(file_metadata.path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read(1024 * 1024)  # Limit to 1MB
+            
+            return {
+                "filename": file_metadata.name,
+                "file_type": "text",
+                "content": content,
+                "metadata": {
+                    "size": file_metadata.size,
+                    "created": file_metadata.created_time.isoformat() if file_metadata.created_time else None,
+                    "modified": file_metadata.modified_time.isoformat() if file_metadata.modified_time else None,
+                    "path": file_metadata.path
+                },
+                "model": model_name
+            }
+        
+        # For binary files: Send metadata only
+        return {
+            "filename": file_metadata.name,
+            "file_type": "binary",
+            "metadata": {
+                "size": file_metadata.size,
+                "extension": os.path.splitext(file_metadata.name)[1],
+                "created": file_metadata.created_time.isoformat() if file_metadata.created_time else None,
+                "modified": file_metadata.modified_time.isoformat() if file_metadata.modified_time else None,
+                "path": file_metadata.path
+            },
+            "model": model_name
+        }
+    
+    def _analyze_with_endpoint(self, endpoint_url, file_metadata, model_name, timestamp=None):
         """Analyze a file using a specific endpoint"""
         try:
-            # For text files: Read content and send it
-            if self._is_text_file(file_metadata.path):
-                with open(file_metadata.path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read(1024 * 1024)  # Limit to 1MB
-                
-                payload = {
-                    "filename": file_metadata.name,
-                    "file_type": "text",
-                    "content": content,
-                    "metadata": {
-                        "size": file_metadata.size,
-                        "created": file_metadata.created_time.isoformat() if file_metadata.created_time else None,
-                        "modified": file_metadata.modified_time.isoformat() if file_metadata.modified_time else None,
-                        "path": file_metadata.path
-                    },
-                    "model": model_name
-                }
-                
-                # In a real implementation:
-                # response = requests.post(f"{endpoint_url}/text", json=payload, timeout=30)
-                # if response.status_code == 200:
-                #     return response.json()
-                
-                # For demonstration, use the mock analysis
-                return self._generate_mock_analysis(file_metadata)
+            payload = self._build_endpoint_payload(file_metadata, model_name)
             
-            # For binary files: Send metadata only
-            else:
-                payload = {
-                    "filename": file_metadata.name,
-                    "file_type": "binary",
-                    "metadata": {
-                        "size": file_metadata.size,
-                        "extension": os.path.splitext(file_metadata.name)[1],
-                        "created": file_metadata.created_time.isoformat() if file_metadata.created_time else None,
-                        "modified": file_metadata.modified_time.isoformat() if file_metadata.modified_time else None,
-                        "path": file_metadata.path
-                    },
-                    "model": model_name
-                }
-                
-                # In a real implementation:
-                # response = requests.post(f"{endpoint_url}/binary", json=payload, timeout=30)
-                # if response.status_code == 200:
-                #     return response.json()
-                
-                # For demonstration, use the mock analysis
-                return self._generate_mock_analysis(file_metadata)
+            # In a real implementation (routes are /text and /binary):
+            # response = self.session.post(f"{endpoint_url}/{payload['file_type']}", data=_json_dumps(payload),
+            #                              headers={"Content-Type": "application/json"}, timeout=30)
+            # if response.status_code == 200:
+            #     return _json_loads(response.content)
+            
+            # For demonstration, use the mock analysis
+            return self._generate_mock_analysis(file_metadata, timestamp)
                 
         except Exception as e:
             logger.error(f"Error analyzing with endpoint {endpoint_url}: {e}")
             return None
     
+    def _analyze_batch_with_endpoint(self, endpoint_url, file_metadatas, model_name, timestamp=None):
+        """Analyze several files with a single request to an endpoint's batch route
+        
+        Returns a list of analyses aligned with file_metadatas (None for files
+        the endpoint could not analyze), or None if the batch request failed.
+        """
+        try:
+            payload = {
+                "files": [self._build_endpoint_payload(metadata, model_name) for metadata in file_metadatas],
+                "model": model_name
+            }
+            
+            # In a real implementation (results are keyed by file path):
+            # response = self.session.post(f"{endpoint_url}/batch", data=_json_dumps(payload),
+            #                              headers={"Content-Type": "application/json"}, timeout=60)
+            # if response.status_code == 404:
+            #     return None  # No batch route, callers fall back to per-file requests
+            # if response.status_code == 200:
+            #     results = _json_loads(response.content).get("results", {})
+            #     return [results.get(metadata.path) for metadata in file_metadatas]
+            
+            # For demonstration, use the mock analysis
+            return [self._generate_mock_analysis(metadata, timestamp) for metadata in file_metadatas]
+        
+        except Exception as e:
+            logger.error(f"Error batch analyzing with endpoint {endpoint_url}: {e}")
+            return None
+    
     def _analyze_with_openai(self, file_metadata, api_key):
         """Analyze a file using OpenAI's API"""
         try:
@@ -224,9 +622,9 @@ class AIAnalysisManager:
             # Initialize OpenAI client
             client = OpenAI(api_key=api_key)
             
-            # Only analyze text files with OpenAI
+            # Only analyze text files with OpenAI; other files get the uncached basic analysis
             if not self._is_text_file(file_metadata.path):
-                return self._generate_basic_analysis(file_metadata)
+                return None
             
             # Read the file content
             with open(file_metadata.path, 'r', encoding='utf-8', errors='ignore') as f:
@@ -264,7 +662,7 @@ class AIAnalysisManager:
             )
             
             # Parse the response
-            result = json.loads(response.choices[0].message.content)
+            result = _json_loads(response.choices[0].message.content)
             
             # Format the analysis
             analysis = {
@@ -285,52 +683,195 @@ class AIAnalysisManager:
             logger.error(f"Error using OpenAI for analysis: {e}")
             return None
     
-    def _store_analysis_in_cache(self, file_metadata, analysis, file_hash):
-        """Store analysis results in the database cache for learning"""
+    def _lookup_cache(self, file_hash):
+        """Look up a stored analysis for a file hash in the database cache"""
         session = db_manager.get_session()
         if not session:
-            return
+            return None
         
         try:
-            # Check if this file hash already exists in the cache
-            existing_entry = session.query(OllamaModelCache).filter_by(
-                result_hash=file_hash,
-                media_type="analysis"
-            ).first()
+            rows = session.query(
+                OllamaModelCache.model_name, OllamaModelCache.id, OllamaModelCache.result_data
+            ).filter(
+                OllamaModelCache.result_hash == file_hash,
+                OllamaModelCache.model_name.in_(_ANALYSIS_MODEL_RANK),
+                OllamaModelCache.media_type == "analysis"
+            ).all()
             
-            # If it exists, update it
-            if existing_entry:
-                existing_entry.result_data = json.dumps(analysis).encode()
-                existing_entry.updated_at = datetime.datetime.now()
-            else:
-                # Create a new cache entry
-                cache_entry = OllamaModelCache(
-                    model_name="file-analyzer",
-                    prompt=file_metadata.path,
-                    parameters=json.dumps({"filename": file_metadata.name, "size": file_metadata.size}),
-                    result_hash=file_hash,
-                    result_data=json.dumps(analysis).encode(),
-                    media_type="analysis"
-                )
-                
-                session.add(cache_entry)
-                
+            return _best_stored_analysis(rows)
+        
+        except Exception as e:
+            logger.error(f"Error looking up cached analysis: {e}")
+            return None
+        
+        finally:
+            session.close()
+    
+    def _lookup_cache_many(self, file_hashes):
+        """Look up stored analyses for several file hashes in one query, keyed by hash"""
+        if not file_hashes:
+            return {}
+        
+        session = db_manager.get_session()
+        if not session:
+            return {}
+        
+        try:
+            rows = session.query(
+                OllamaModelCache.result_hash, OllamaModelCache.model_name,
+                OllamaModelCache.id, OllamaModelCache.result_data
+            ).filter(
+                OllamaModelCache.result_hash.in_(set(file_hashes)),
+                OllamaModelCache.model_name.in_(_ANALYSIS_MODEL_RANK),
+                OllamaModelCache.media_type == "analysis"
+            )
+            
+            rows_by_hash = {}
+            for file_hash, *row in rows:
+                rows_by_hash.setdefault(file_hash, []).append(row)
+            
+            # Same choice per hash as _lookup_cache
+            stored = {}
+            for file_hash, hash_rows in rows_by_hash.items():
+                analysis = _best_stored_analysis(hash_rows)
+                if analysis is not None:
+                    stored[file_hash] = analysis
+            return stored
+        
+        except Exception as e:
+            logger.error(f"Error looking up cached analyses: {e}")
+            return {}
+        
+        finally:
+            session.close()
+    
+    def _store_analysis_in_cache(self, file_metadata, analysis, file_hash, model_name="file-analyzer"):
+        """Store analysis results in the database cache for learning and reuse"""
+        self._store_analyses_in_cache([(file_metadata, analysis, file_hash, model_name)])
+    
+    def _store_analyses_in_cache(self, entries):
+        """Store (file_metadata, analysis, file_hash, model_name) entries in one transaction"""
+        if not entries:
+            return
+        
+        session = db_manager.get_session()
+        if not session:
+            return
+        
+        try:
+            for entry in entries:
+                self._write_analysis_cache_entry(session, *entry)
             session.commit()
-            logger.info(f"Stored analysis in cache for {file_metadata.name}")
+            logger.info(f"Stored {len(entries)} analyses in cache")
             
         except Exception as e:
-            logger.error(f"Error storing analysis in cache: {e}")
             session.rollback()
+            if len(entries) == 1:
+                logger.error(f"Error storing analysis in cache: {e}")
+                return
+            
+            # Retry one by one so a single bad entry doesn't drop the whole batch
+            logger.warning(f"Batched cache write failed, retrying per entry: {e}")
+            for entry in entries:
+                try:
+                    self._write_analysis_cache_entry(session, *entry)
+                    session.commit()
+                except Exception as e:
+                    logger.error(f"Error storing analysis in cache for {entry[0].name}: {e}")
+                    session.rollback()
         
         finally:
             session.close()
     
+    def _write_analysis_cache_entry(self, session, file_metadata, analysis, file_hash, model_name):
+        """Add or update one analysis cache row in an open session without committing"""
+        result_data = _json_dumps(analysis)
+        
+        # Update an existing entry in place; the table has no unique key
+        # to upsert on, so only insert when nothing was updated
+        updated = session.execute(
+            update(OllamaModelCache).where(
+                OllamaModelCache.result_hash == file_hash,
+                OllamaModelCache.model_name == model_name,
+                OllamaModelCache.media_type == "analysis"
+            ).values(result_data=result_data)
+        ).rowcount
+        
+        if not updated:
+            session.execute(insert(OllamaModelCache).values(
+                model_name=model_name,
+                prompt=file_metadata.path,
+                parameters=json.dumps({"filename": file_metadata.name, "size": file_metadata.size}),
+                result_hash=file_hash,
+                result_data=result_data,
+                media_type="analysis"
+            ))
+    
     def analyze_directory(self, file_metadatas):
         """Analyze a group of files from a directory using tiered approach"""
-        # Analyze each file with our tiered approach
-        analyses = []
-        for metadata in file_metadatas:
-            analyses.append(self.analyze_file(metadata))
+        file_metadatas = list(file_metadatas)
+        analyses = [None] * len(file_metadatas)
+        
+        # Stamp every analysis in this run with the same time
+        timestamp = datetime.datetime.now().isoformat()
+        
+        # Cache writes are collected from the workers and committed together
+        pending_writes = []
+        
+        # Work is network-bound, so run batches and single files concurrently
+        with ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS) as executor:
+            # Collapse uncached files into batch requests to the first available tier
+            tier = next((name for name in ("tier1", "tier2") if self._is_available(name)), None)
+            if tier:
+                file_hashes = list(executor.map(self._get_file_hash, [m.path for m in file_metadatas]))
+                
+                candidates = []
+                for index, (metadata, file_hash) in enumerate(zip(file_metadatas, file_hashes)):
+                    if not file_hash or not os.access(metadata.path, os.R_OK):
+                        continue
+                    if self._get_cached_analysis(file_hash) is not None or self._recently_failed(file_hash):
+                        continue
+                    candidates.append((index, metadata, file_hash))
+                
+                # Files with an analysis in the persistent cache aren't sent again
+                stored_analyses = self._lookup_cache_many([file_hash for _, _, file_hash in candidates])
+                pending = []
+                for index, metadata, file_hash in candidates:
+                    stored_analysis = stored_analyses.get(file_hash)
+                    if stored_analysis is None:
+                        pending.append((index, metadata, file_hash))
+                        continue
+                    
+                    logger.info(f"Using stored analysis for {metadata.name}")
+                    self._cache_analysis(file_hash, stored_analysis)
+                    analyses[index] = stored_analysis
+                
+                batches = [pending[i:i + ANALYSIS_BATCH_SIZE] for i in range(0, len(pending), ANALYSIS_BATCH_SIZE)]
+                endpoint = self.endpoints[tier]
+                batch_results = executor.map(
+                    lambda batch: self._analyze_batch_with_endpoint(
+                        endpoint["url"], [metadata for _, metadata, _ in batch], endpoint["models"][0], timestamp
+                    ),
+                    batches
+                )
+                
+                for batch, results in zip(batches, batch_results):
+                    self._record_tier_result(tier, results is not None)
+                    for (index, metadata, file_hash), analysis in zip(batch, results or []):
+                        if not analysis:
+                            continue
+                        
+                        pending_writes.append((metadata, analysis, file_hash, endpoint["models"][0]))
+                        self._cache_analysis(file_hash, analysis)
+                        analyses[index] = analysis
+            
+            # Anything not answered by a batch goes through the per-file tiers
+            remaining = [index for index, analysis in enumerate(analyses) if analysis is None]
+            analyze = functools.partial(self.analyze_file, timestamp=timestamp, pending_writes=pending_writes)
+            for index, analysis in zip(remaining, executor.map(analyze, [file_metadatas[i] for i in remaining])):
+                analyses[index] = analysis
+        
+        self._store_analyses_in_cache(pending_writes)
         
         common_tags = self._find_common_tags(analyses)
         return {
@@ -338,7 +879,7 @@ class AIAnalysisManager:
             'common_tags': common_tags,
             'file_count': len(analyses),
             'total_size': sum(a.get('size', 0) for a in analyses),
-            'timestamp': datetime.datetime.now().isoformat()
+            'timestamp': timestamp
         }
     
     def detect_duplicates(self):
@@ -395,25 +936,26 @@ class AIAnalysisManager:
             return
         
         try:
-            for rec in recommendations:
-                # Create a file record for reference if needed
-                file_id = None
-                if 'details' in rec and 'path' in rec['details']:
-                    # Check if the file exists in the database
-                    file = session.query(File).filter_by(path=rec['details']['path']).first()
-                    if file:
-                        file_id = file.id
-                
-                # Create the recommendation
-                recommendation = Recommendation(
-                    file_id=file_id,
-                    recommendation_type=rec['type'],
-                    description=rec['description'],
-                    severity=rec['severity'],
-                    is_dismissed=False
-                )
-                
-                session.add(recommendation)
+            # Resolve all referenced file paths to ids in one query
+            paths = {rec['details']['path'] for rec in recommendations
+                     if 'details' in rec and 'path' in rec['details']}
+            file_ids = {}
+            if paths:
+                rows = session.query(File.id, File.path).filter(File.path.in_(paths)).order_by(File.id)
+                for file_id, path in rows:
+                    file_ids.setdefault(path, file_id)
+            
+            # Insert all recommendations in a single batch
+            session.bulk_insert_mappings(Recommendation, [
+                {
+                    'file_id': file_ids.get(rec.get('details', {}).get('path')),
+                    'recommendation_type': rec['type'],
+                    'description': rec['description'],
+                    'severity': rec['severity'],
+                    'is_dismissed': False
+                }
+                for rec in recommendations
+            ])
             
             session.commit()
             logger.info(f"Stored {len(recommendations)} recommendations in the database")
@@ -429,29 +971,10 @@ class AIAnalysisManager:
         """Suggest tags for a file based on content and context using tiered approach"""
         # In a real implementation, this would use the tiered approach for analysis
         
-        # For demonstration, return tags based on file extension
-        extension = os.path.splitext(file_metadata.name)[1].lower()
-        
-        tag_sets = {
-            '.pdf': ['document', 'report', 'reading'],
-            '.docx': ['document', 'writing', 'work'],
-            '.xlsx': ['spreadsheet', 'data', 'finance'],
-            '.pptx': ['presentation', 'slides', 'meeting'],
-            '.jpg': ['image', 'photo', 'visual'],
-            '.png': ['image', 'graphic', 'screenshot'],
-            '.mp3': ['audio', 'music', 'sound'],
-            '.mp4': ['video', 'movie', 'media'],
-            '.zip': ['archive', 'compressed', 'backup'],
-            '.py': ['code', 'python', 'development'],
-            '.js': ['code', 'javascript', 'web'],
-            '.html': ['code', 'web', 'frontend'],
-            '.css': ['code', 'web', 'style']
-        }
-        
-        # Return default tags or extension-specific tags
-        return tag_sets.get(extension, ['file', 'document', 'data'])
+        # For demonstration, return default tags or extension-specific tags
+        return list(_EXT_TAGS.get(_file_extension(file_metadata.name), _DEFAULT_TAGS))
     
-    def _generate_basic_analysis(self, file_metadata):
+    def _generate_basic_analysis(self, file_metadata, timestamp=None):
         """Generate basic analysis with minimal information (fallback)"""
         return {
             'filename': file_metadata.name,
@@ -459,60 +982,77 @@ class AIAnalysisManager:
             'size': file_metadata.size,
             'content_type': self._guess_content_type(file_metadata.name),
             'suggested_tags': self.suggest_tags(file_metadata),
-            'timestamp': datetime.datetime.now().isoformat()
+            'timestamp': timestamp or datetime.datetime.now().isoformat()
         }
     
-    def _generate_mock_analysis(self, file_metadata):
+    def _generate_mock_analysis(self, file_metadata, timestamp=None):
         """Generate more detailed mock analysis for demonstration"""
-        extension = os.path.splitext(file_metadata.name)[1].lower()
+        extension = _file_extension(file_metadata.name)
+        document_type = _MOCK_DOCUMENT_TYPES.get(extension)
         
         # Base analysis
-        analysis = self._generate_basic_analysis(file_metadata)
+        analysis = self._generate_basic_analysis(file_metadata, timestamp)
         
-        # Add more details based on extension
-        if extension in ['.pdf', '.docx', '.txt']:
+        # Add more details based on extension; each branch makes a single
+        # vectorized draw, with inclusive [low, high] bounds per field
+        if document_type == 'text':
+            word_count, read_time, contains_images, language = _mock_draw(
+                [500, 2, 0, 0], [5000, 30, 1, len(_MOCK_LANGUAGES) - 1]
+            )
             analysis['document_type'] = 'text'
-            analysis['estimated_word_count'] = random.randint(500, 5000)
-            analysis['estimated_read_time'] = f"{random.randint(2, 30)} minutes"
-            analysis['contains_images'] = random.choice([True, False])
-            analysis['language'] = random.choice(['English', 'Spanish', 'French', 'German'])
+            analysis['estimated_word_count'] = word_count
+            analysis['estimated_read_time'] = f"{read_time} minutes"
+            analysis['contains_images'] = bool(contains_images)
+            analysis['language'] = _MOCK_LANGUAGES[language]
             analysis['summary'] = "This document appears to contain text content related to business or technical documentation."
             
-        elif extension in ['.jpg', '.png', '.gif']:
+        elif document_type == 'image':
+            width, height, color_profile, objects, contains_people = _mock_draw(
+                [800, 600, 0, 1, 0], [3000, 2000, len(_MOCK_COLOR_PROFILES) - 1, 10, 1]
+            )
             analysis['document_type'] = 'image'
-            analysis['dimensions'] = f"{random.randint(800, 3000)}x{random.randint(600, 2000)}"
-            analysis['color_profile'] = random.choice(['RGB', 'CMYK', 'Grayscale'])
-            analysis['estimated_objects'] = random.randint(1, 10)
-            analysis['contains_people'] = random.choice([True, False])
+            analysis['dimensions'] = f"{width}x{height}"
+            analysis['color_profile'] = _MOCK_COLOR_PROFILES[color_profile]
+            analysis['estimated_objects'] = objects
+            analysis['contains_people'] = bool(contains_people)
             analysis['summary'] = "This image likely contains visual content that may include people, landscapes, or objects."
             
-        elif extension in ['.mp3', '.wav', '.flac']:
+        elif document_type == 'audio':
+            minutes, seconds, bitrate, channels = _mock_draw(
+                [1, 0, 0, 0], [10, 59, len(_MOCK_BITRATES) - 1, len(_MOCK_CHANNELS) - 1]
+            )
             analysis['document_type'] = 'audio'
-            analysis['duration'] = f"{random.randint(1, 10)}:{random.randint(0, 59):02d}"
-            analysis['bitrate'] = f"{random.choice([128, 192, 256, 320])} kbps"
-            analysis['channels'] = random.choice(['Mono', 'Stereo'])
+            analysis['duration'] = f"{minutes}:{seconds:02d}"
+            analysis['bitrate'] = f"{_MOCK_BITRATES[bitrate]} kbps"
+            analysis['channels'] = _MOCK_CHANNELS[channels]
             analysis['summary'] = "This audio file contains sound that may be music, voice, or other audio content."
             
-        elif extension in ['.mp4', '.avi', '.mov']:
+        elif document_type == 'video':
+            minutes, seconds, resolution, fps, has_audio = _mock_draw(
+                [1, 0, 0, 0, 0], [120, 59, len(_MOCK_RESOLUTIONS) - 1, len(_MOCK_FRAME_RATES) - 1, 1]
+            )
             analysis['document_type'] = 'video'
-            analysis['duration'] = f"{random.randint(1, 120)}:{random.randint(0, 59):02d}"
-            analysis['resolution'] = random.choice(['720p', '1080p', '4K'])
-            analysis['fps'] = random.choice([24, 30, 60])
-            analysis['has_audio'] = random.choice([True, False])
+            analysis['duration'] = f"{minutes}:{seconds:02d}"
+            analysis['resolution'] = _MOCK_RESOLUTIONS[resolution]
+            analysis['fps'] = _MOCK_FRAME_RATES[fps]
+            analysis['has_audio'] = bool(has_audio)
             analysis['summary'] = "This video file contains moving visual content that may include people, scenes, or animations."
             
-        elif extension in ['.py', '.js', '.html', '.css', '.java', '.cpp']:
+        elif document_type == 'code':
+            line_count, functions_count, has_comments = _mock_draw([50, 5, 0], [1000, 50, 1])
             analysis['document_type'] = 'code'
-            analysis['estimated_line_count'] = random.randint(50, 1000)
-            analysis['functions_count'] = random.randint(5, 50)
-            analysis['language'] = self._get_programming_language(extension)
-            analysis['has_comments'] = random.choice([True, False])
-            analysis['summary'] = f"This file contains {self._get_programming_language(extension)} code with multiple functions and classes."
+            analysis['estimated_line_count'] = line_count
+            analysis['functions_count'] = functions_count
+            language = self._get_programming_language(extension)
+            analysis['language'] = language
+            analysis['has_comments'] = bool(has_comments)
+            analysis['summary'] = f"This file contains {language} code with multiple functions and classes."
             
         return analysis
     
     def _generate_mock_recommendations(self):
         """Generate mock recommendations for demonstration"""
+        timestamp = datetime.datetime.now().isoformat()
         recommendations = [
             {
                 'id': 1,
@@ -525,7 +1065,7 @@ class AIAnalysisManager:
                     'potential_saving': '1.2 GB'
                 },
                 'action': 'review_duplicates',
-                'timestamp': datetime.datetime.now().isoformat()
+                'timestamp': timestamp
             },
             {
                 'id': 2,
@@ -538,7 +1078,7 @@ class AIAnalysisManager:
                     'oldest_file': '2.5 years old'
                 },
                 'action': 'review_obsolete',
-                'timestamp': datetime.datetime.now().isoformat()
+                'timestamp': timestamp
             },
             {
                 'id': 3,
@@ -552,7 +1092,7 @@ class AIAnalysisManager:
                     'suggestion': 'Create subfolders by file type'
                 },
                 'action': 'organize_folder',
-                'timestamp': datetime.datetime.now().isoformat()
+                'timestamp': timestamp
             },
             {
                 'id': 4,
@@ -566,7 +1106,7 @@ class AIAnalysisManager:
                     'suggestion': 'Schedule regular backups'
                 },
                 'action': 'backup_folder',
-                'timestamp': datetime.datetime.now().isoformat()
+                'timestamp': timestamp
             },
             {
                 'id': 5,
@@ -580,94 +1120,51 @@ class AIAnalysisManager:
                     'suggestion': 'Consider archiving to external storage'
                 },
                 'action': 'review_large_files',
-                'timestamp': datetime.datetime.now().isoformat()
+                'timestamp': timestamp
             }
         ]
         return recommendations
     
     def _guess_content_type(self, filename):
         """Guess the content type of a file based on extension"""
-        extension = os.path.splitext(filename)[1].lower()
-        
-        content_types = {
-            '.pdf': 'application/pdf',
-            '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.mp3': 'audio/mpeg',
-            '.mp4': 'video/mp4',
-            '.avi': 'video/x-msvideo',
-            '.zip': 'application/zip',
-            '.txt': 'text/plain',
-            '.html': 'text/html',
-            '.css': 'text/css',
-            '.js': 'application/javascript',
-            '.json': 'application/json',
-            '.xml': 'application/xml',
-            '.py': 'text/x-python',
-            '.c': 'text/x-c',
-            '.cpp': 'text/x-c++',
-            '.java': 'text/x-java',
-        }
-        
-        return content_types.get(extension, 'application/octet-stream')
+        return CONTENT_TYPES.get(_file_extension(filename), 'application/octet-stream')
     
     def _get_programming_language(self, extension):
         """Get the programming language based on file extension"""
-        languages = {
-            '.py': 'Python',
-            '.js': 'JavaScript',
-            '.html': 'HTML',
-            '.css': 'CSS',
-            '.java': 'Java',
-            '.cpp': 'C++',
-            '.c': 'C',
-            '.go': 'Go',
-            '.rb': 'Ruby',
-            '.php': 'PHP',
-            '.ts': 'TypeScript',
-            '.swift': 'Swift',
-            '.kt': 'Kotlin',
-            '.rs': 'Rust'
-        }
-        
-        return languages.get(extension, 'Unknown')
+        return PROGRAMMING_LANGUAGES.get(extension, 'Unknown')
     
     def _is_text_file(self, file_path):
         """Check if a file is a text file based on extension and content"""
         # Check extension first
-        extension = os.path.splitext(file_path)[1].lower()
-        text_extensions = ['.txt', '.md', '.html', '.css', '.js', '.py', '.java', '.c', '.cpp', 
-                          '.h', '.json', '.xml', '.csv', '.log', '.sh', '.bat', '.ps1', '.yaml', 
-                          '.yml', '.ini', '.cfg', '.conf', '.php', '.rb', '.ts', '.go', '.rs']
-        
-        if extension in text_extensions:
+        extension = _file_extension(file_path)
+        if extension in TEXT_EXTENSIONS:
             return True
+        if extension in _BINARY_EXTENSIONS:
+            return False
         
         # If file doesn't exist or is too large, consider it binary
-        if not os.path.exists(file_path) or os.path.getsize(file_path) > 10 * 1024 * 1024:  # 10MB
+        try:
+            if os.stat(file_path).st_size > 10 * 1024 * 1024:  # 10MB
+                return False
+        except OSError:
             return False
         
         # Try to open and read as text
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            with open(file_path, 'rb') as f:
                 # Read first 1024 bytes
                 sample = f.read(1024)
-                
-                # Check for null bytes (common in binary files)
-                if '\0' in sample:
-                    return False
-                
-                # Check if at least 90% of characters are printable ASCII
-                printable_count = sum(1 for c in sample if 32 <= ord(c) <= 126 or c in '\n\r\t')
-                if printable_count / len(sample) < 0.9:
-                    return False
-                
-                return True
+            
+            if not sample:
+                return False
+            
+            # Check for null bytes (common in binary files)
+            if b'\0' in sample:
+                return False
+            
+            # Check if at least 90% of bytes are printable ASCII
+            printable_count = len(sample.translate(None, _NON_PRINTABLE_BYTES))
+            return printable_count / len(sample) >= 0.9
         except Exception:
             return False
     
@@ -676,15 +1173,12 @@ class AIAnalysisManager:
         if not analyses:
             return []
         
-        # Extract all tags from all analyses
-        all_tags = {}
-        for analysis in analyses:
-            for tag in analysis.get('suggested_tags', []):
-                all_tags[tag] = all_tags.get(tag, 0) + 1
+        # Count tags across all analyses in one pass
+        tag_counts = Counter(tag for analysis in analyses for tag in analysis.get('suggested_tags', ()))
         
         # Find tags that appear in more than 50% of files
         common_threshold = len(analyses) * 0.5
-        common_tags = [tag for tag, count in all_tags.items() if count >= common_threshold]
+        common_tags = [tag for tag, count in tag_counts.items() if count >= common_threshold]
         
         return common_tags
 
@@ -6,20 +6,60 @@ Handles AI-generated images and videos using Ollama and generative AI capabiliti
 import os
 import io
 import json
+import atexit
 import logging
 import time
 import base64
 import datetime
+import functools
+import hashlib
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
 import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
 from PIL import Image
 import cv2
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, LargeBinary, Index, case, select
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.exc import SQLAlchemyError
 from database import db_manager
 from models import Base, File, OllamaModelCache
 
+# Optional imports - will be used if available
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):  # RuntimeError: libturbojpeg itself is missing
+    TURBOJPEG_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +68,26 @@ logger = logging.getLogger(__name__)
 DEFAULT_IMAGE_SIZE = (1024, 1024)
 DEFAULT_VIDEO_LENGTH = 5  # seconds
 VIDEO_FRAME_RATE = 24
+VIDEO_RENDER_BATCH = 16  # frames whose gradient backgrounds are rendered per call
+FFMPEG_BINARY = shutil.which("ffmpeg")  # Encode videos through an ffmpeg pipe when available
+WRITE_CHUNK_SIZE = 1024 * 1024  # bytes written (and hashed) per step when saving generated media
+MAX_CACHED_DIR_FDS = 32  # output directories kept open for creating files relative to them
+ENDPOINT_RECHECK_INTERVAL = 60  # seconds before an endpoint's availability is probed again
+ENDPOINT_PROBE_TIMEOUT = 0.5  # seconds to wait for a TCP connection when probing an endpoint
+GENERATION_MAX_WORKERS = int(os.environ.get("SYNAPSE_GEN_WORKERS", 4))  # concurrent generations
+MODEL_LIST_CACHE_TTL = 30  # seconds get_models results are reused, since models rarely change
+
+# In-memory LRU in front of the database image cache; set the byte limit to 0 to disable it
+IMAGE_MEMORY_CACHE_MAX_ENTRIES = 512
+IMAGE_MEMORY_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_MEMORY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Cached images are stored as content-addressed files here; the database keeps only their paths
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join("generated_media", "cache"))
+
+# Similar-prompt lookup, used after an exact cache miss when sentence-transformers is installed
+SEMANTIC_CACHE_MODEL = "all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity to reuse a cached image
+SEMANTIC_CACHE_CANDIDATES = 256  # Most recent entries compared per lookup
 # Multiple Ollama endpoints
 LOCAL_OLLAMA_URL = "http://localhost:11434"  # Local lightweight models
 REMOTE_OLLAMA_URL = "http://192.168.1.100:11434"  # Remote server with larger models
@@ -41,13 +101,412 @@ TIER1_MODELS = ["llava:7b", "stable-diffusion:small", "playground-small"]  # Lig
 TIER2_MODELS = ["llava:13b", "stable-diffusion", "playground", "zeroscope:v2", "animatediff"]  # Remote laptop models
 TIER3_MODELS = ["dall-e-3", "midjourney", "modelscope"]  # External API models
 
+# Model names without their version tag, and the tagged Tier 2 variant of each base model
+TIER1_BASE = frozenset(m.split(":", 1)[0] for m in TIER1_MODELS)
+TIER2_BY_BASE = {m.split(":", 1)[0]: m for m in TIER2_MODELS if ":" in m}
+
 SUPPORTED_IMAGE_MODELS = TIER1_MODELS + TIER2_MODELS + ["dall-e-3", "midjourney"]
 SUPPORTED_VIDEO_MODELS = ["zeroscope:v2", "animatediff", "modelscope"]
 
-class AIMediaModel(Base):
+def _json_loads(data):
+    """Parse JSON, using orjson when available"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+@functools.lru_cache(maxsize=1)
+def _get_prompt_embedder():
+    """Load the sentence embedding model once, on first use"""
+    return SentenceTransformer(SEMANTIC_CACHE_MODEL)
+
+def _embed_prompt(prompt):
+    """Embed a normalized prompt as a unit-length float32 vector, or None if unavailable"""
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        return None
+    
+    try:
+        normalized = " ".join(prompt.lower().split())
+        return _get_prompt_embedder().encode(normalized, normalize_embeddings=True).astype(np.float32)
+    except Exception as e:
+        logger.error(f"Error embedding prompt: {e}")
+        return None
+
+def _make_thumbnail(image_source, size=(256, 256)):
+    """Downscale encoded image bytes, or an image file path, to a thumbnail"""
+    img = Image.open(io.BytesIO(image_source) if isinstance(image_source, bytes) else image_source)
+    
+    # Already small enough: reuse the encoded image instead of re-encoding it, but
+    # only for PNG and JPEG, the formats _thumbnail_path names thumbnails for
+    if img.width <= size[0] and img.height <= size[1] and img.format in ("PNG", "JPEG"):
+        if isinstance(image_source, bytes):
+            return image_source
+        with open(image_source, "rb") as f:
+            return f.read()
+    
+    # reducing_gap lets PIL shrink with a cheap box reduce before the final resample
+    img.thumbnail(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    thumbnail_buffer = io.BytesIO()
+    
+    # Keep transparency as PNG; everything else becomes a compact JPEG
+    if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+        img.save(thumbnail_buffer, format="PNG")
+    else:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(thumbnail_buffer, format="JPEG", quality=80, optimize=False)
+    return thumbnail_buffer.getvalue()
+
+# Directories already created by this process, so repeat writes skip the makedirs syscalls
+_known_dirs = set()
+_known_dirs_lock = threading.Lock()
+
+def _ensure_dir(path):
+    """Create a directory (and parents) unless this process already has"""
+    if path in _known_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    with _known_dirs_lock:
+        _known_dirs.add(path)
+
+# Output directory -> open descriptor, so new files are created with openat() relative
+# to it; least recently used first. Descriptors are only used and closed under the lock,
+# so one is never closed while a writer is opening a file relative to it
+_dir_fds = OrderedDict()
+_dir_fds_lock = threading.Lock()
+
+def _directory_fd(path):
+    """Open descriptor for an output directory; call with _dir_fds_lock held"""
+    st = os.stat(path)
+    fd = _dir_fds.get(path)
+    if fd is not None:
+        # Reuse the descriptor only while the path still names the directory it refers to
+        fd_st = os.fstat(fd)
+        if (fd_st.st_dev, fd_st.st_ino) == (st.st_dev, st.st_ino):
+            _dir_fds.move_to_end(path)
+            return fd
+        os.close(_dir_fds.pop(path))
+    
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    _dir_fds[path] = fd
+    if len(_dir_fds) > MAX_CACHED_DIR_FDS:
+        _, evicted = _dir_fds.popitem(last=False)
+        os.close(evicted)
+    return fd
+
+def _close_directory_fds():
+    """Close every cached output directory descriptor"""
+    with _dir_fds_lock:
+        while _dir_fds:
+            _, fd = _dir_fds.popitem()
+            os.close(fd)
+
+def _open_for_write(path):
+    """Open a file for binary writing, relative to its cached directory descriptor when possible"""
+    if os.open not in os.supports_dir_fd:
+        return open(path, "wb")
+    directory, name = os.path.split(os.path.abspath(path))
+    with _dir_fds_lock:
+        fd = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666, dir_fd=_directory_fd(directory))
+    return os.fdopen(fd, "wb")
+
+def _write_cache_file(data):
+    """Write data to a content-addressed file under IMAGE_CACHE_DIR, returning its path"""
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    path = os.path.join(IMAGE_CACHE_DIR, digest[:2], f"{digest}.png")
+    if not os.path.exists(path):
+        _ensure_dir(os.path.dirname(path))
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return path
+
+def _encode_jpeg(frame, quality=95):
+    """Encode a BGR frame as JPEG bytes, with libjpeg-turbo directly when available"""
+    if TURBOJPEG_AVAILABLE:
+        return _turbo_jpeg.encode(frame, quality=quality, pixel_format=TJPF_BGR)
+    _, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return data.tobytes()
+
+def _thumbnail_path(save_path, thumbnail_data):
+    """Path of the thumbnail file kept next to a generated media file"""
+    # _make_thumbnail only ever produces PNG or JPEG data
+    extension = ".png" if thumbnail_data.startswith(b"\x89PNG") else ".jpg"
+    return f"{save_path}.thumb{extension}"
+
+def _load_thumbnail(media):
+    """Read a media item's thumbnail from its file, or from the blob column for older rows"""
+    if media.thumbnail_path:
+        try:
+            with open(media.thumbnail_path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"Could not read thumbnail {media.thumbnail_path}: {e}")
+            return None
+    return media.thumbnail
+
+def _write_file(path, data, digest=False):
+    """Write bytes to a file, returning their SHA-256 hex digest if requested"""
+    # Hash each chunk right after writing it, while it is still in cache; the
+    # digest matches file_system's duplicate-detection hash
+    sha256 = hashlib.sha256() if digest else None
+    view = memoryview(data)
+    with _open_for_write(path) as f:
+        for offset in range(0, len(view), WRITE_CHUNK_SIZE):
+            chunk = view[offset:offset + WRITE_CHUNK_SIZE]
+            f.write(chunk)
+            if sha256:
+                sha256.update(chunk)
+    return sha256.hexdigest() if sha256 else None
+
+def _read_cache_entry(entry):
+    """Get the result bytes of a cache row, from its file or from the legacy blob column"""
+    if entry.result_path:
+        try:
+            with open(entry.result_path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"Cached image file {entry.result_path} is unreadable: {e}")
+            return None
+    return entry.result_data
+
+def _cache_params(params):
+    """Pick the parameters that identify a cached generation"""
+    return {
+        "prompt": params["prompt"],
+        "negative_prompt": params.get("negative_prompt", ""),
+        "width": params["width"],
+        "height": params["height"],
+        "seed": params["seed"]
+    }
+
+def _cache_key(params):
+    """Hash generation parameters into an Ollama model cache key"""
+    # Compact, sorted UTF-8 JSON; orjson and the json fallback produce the same bytes
+    if ORJSON_AVAILABLE:
+        param_bytes = orjson.dumps(_cache_params(params), option=orjson.OPT_SORT_KEYS)
+    else:
+        param_bytes = json.dumps(_cache_params(params), sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+    return hashlib.blake2b(param_bytes, digest_size=16).hexdigest()
+
+def _legacy_cache_key(params):
+    """Hash generation parameters the way older cache entries were keyed (MD5)"""
+    return hashlib.md5(json.dumps(_cache_params(params), sort_keys=True).encode()).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _glyph_advance(char, font):
+    """Advance of a single glyph in font units (its width at scale 1 with no stroke thickness)"""
+    return cv2.getTextSize(char, font, 1.0, 0)[0][0]
+
+def _text_advance(text, font, font_scale, start=0.0):
+    """Sum the scaled glyph advances of text onto start, in the same order cv2.getTextSize does"""
+    x = start
+    for char in text:
+        x += _glyph_advance(char, font) * font_scale
+    return x
+
+@functools.lru_cache(maxsize=None)
+def _advances_are_additive(font, font_scale, thickness):
+    """Check that this OpenCV build measures text as round(sum of advances + thickness)"""
+    probe = "The quick brown fox jumps over the lazy dog, 0123456789 times!"
+    return round(_text_advance(probe, font, font_scale) + thickness) == cv2.getTextSize(probe, font, font_scale, thickness)[0][0]
+
+@functools.lru_cache(maxsize=128)
+def _wrapped_lines(text, width, font, font_scale, thickness):
+    """Wrap text to fit within a given width, memoized since prompts repeat across frames and thumbnails"""
+    words = text.split(' ')
+    lines = []
+    current_line = ""
+    
+    # Printable ASCII is measured from per-glyph advances instead of one cv2.getTextSize
+    # call per word on the whole line; other text, or builds that measure differently,
+    # keep using cv2.getTextSize
+    use_advances = text.isascii() and text.isprintable() and _advances_are_additive(font, font_scale, thickness)
+    line_x = 0.0
+    
+    for word in words:
+        # Test if adding this word would exceed the width
+        test_line = current_line + word + " "
+        if use_advances:
+            test_x = _text_advance(word + " ", font, font_scale, line_x)
+            test_width = round(test_x + thickness)
+        else:
+            test_width = cv2.getTextSize(test_line, font, font_scale, thickness)[0][0]
+        
+        if test_width > width - 60:  # 60 pixels margin
+            lines.append(current_line)
+            current_line = word + " "
+            if use_advances:
+                line_x = _text_advance(current_line, font, font_scale)
+        else:
+            current_line = test_line
+            if use_advances:
+                line_x = test_x
+    
+    if current_line:
+        lines.append(current_line)
+    
+    # Limit to a maximum of 5 lines
+    if len(lines) > 5:
+        lines = lines[:4]
+        lines.append("...")
+    
+    return tuple(lines)
+
+@functools.lru_cache(maxsize=8)
+def _placeholder_gradient(width, height):
+    """Gradient background for placeholder images of a given size, cached read-only"""
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    
+    # Computed for all pixels at once
+    xs = np.arange(width) / width
+    ys = np.arange(height) / height
+    img[:, :, 0] = 255 * xs  # Blue channel
+    img[:, :, 1] = (255 * ys)[:, None]  # Green channel
+    img[:, :, 2] = 255 * 0.5 * (xs[None, :] + ys[:, None])  # Red channel
+    
+    img.setflags(write=False)
+    return img
+
+def _draw_frame_text(frame, caption, text_rows, font, caption_position):
+    """Draw the wrapped prompt and a caption onto a video frame in place"""
+    for line, position in text_rows:
+        cv2.putText(frame, line, position, font, 1, (255, 255, 255), 2, cv2.LINE_AA)
+    cv2.putText(frame, caption, caption_position, font, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
+
+def _fill_gradient_frames(out, start):
+    """Fill each out[f] with the moving gradient of frame number start + f"""
+    height, width = out.shape[1:3]
+    xs = np.arange(width, dtype=np.int32)
+    ys = np.arange(height, dtype=np.int32)[:, None]
+    # (xy_sum + k) % 255 == table_k[xy_sum % 255], so the full-size red channel is a
+    # 256-entry table lookup per frame instead of a per-pixel integer modulo
+    xy_mod = ((xs + ys) // 2 % 255).astype(np.uint8)
+    table_index = np.arange(256, dtype=np.int32)
+    
+    for f in range(out.shape[0]):
+        i = start + f
+        out[f, ..., 0] = np.mod(xs + i * 5, 255).astype(np.uint8)  # Blue channel
+        out[f, ..., 1] = np.mod(ys + i * 3, 255).astype(np.uint8)  # Green channel
+        out[f, ..., 2] = cv2.LUT(xy_mod, np.mod(table_index + i * 7, 255).astype(np.uint8))  # Red channel
+
+if NUMBA_AVAILABLE:
+    # Compiled eagerly (and cached on disk) for C-contiguous uint8 buffers, so the first
+    # video pays no JIT cost and the inner loop is specialized for unit-stride stores
+    @njit("void(uint8[:, :, :, ::1], int64)", parallel=True, fastmath=True, cache=True)
+    def _render_gradient_frames(out, start):
+        """Compiled equivalent of _fill_gradient_frames, spreading frames across cores"""
+        num_frames, height, width = out.shape[0], out.shape[1], out.shape[2]
+        for f in prange(num_frames):
+            i = start + f
+            for y in range(height):
+                green = (y + i * 3) % 255
+                for x in range(width):
+                    out[f, y, x, 0] = (x + i * 5) % 255
+                    out[f, y, x, 1] = green
+                    out[f, y, x, 2] = ((x + y) // 2 + i * 7) % 255
+else:
+    _render_gradient_frames = _fill_gradient_frames
+
+@functools.lru_cache(maxsize=1)
+def _ffmpeg_codec_args():
+    """Pick the H.264 encoder for piped videos, preferring NVENC when it actually works"""
+    probe = [FFMPEG_BINARY, "-v", "error", "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+             "-c:v", "h264_nvenc", "-f", "null", "-"]
+    try:
+        if subprocess.run(probe, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10).returncode == 0:
+            return ("-c:v", "h264_nvenc")
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return ("-c:v", "libx264", "-preset", "ultrafast")
+
+class _VideoEncoder:
+    """Encodes BGR frames into MP4 bytes, piping them through ffmpeg as YUV420p when it is installed"""
+    
+    def __init__(self, width, height, fps):
+        self._proc = None
+        self._writer = None
+        self._temp_path = None
+        self._chunks = []
+        
+        # yuv420p output needs even dimensions; otherwise use OpenCV's writer and a temp file
+        if FFMPEG_BINARY and width % 2 == 0 and height % 2 == 0:
+            # Frames are sent in the encoder's own pixel format: half the bytes of BGR
+            # and no colour conversion pass inside ffmpeg
+            command = [FFMPEG_BINARY, "-v", "error", "-f", "rawvideo", "-pix_fmt", "yuv420p",
+                       "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                       *_ffmpeg_codec_args(),
+                       "-movflags", "frag_keyframe+empty_moov", "-f", "mp4", "pipe:1"]
+            self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL)
+            
+            # Drain stdout concurrently so ffmpeg never blocks on a full pipe
+            self._reader = threading.Thread(target=self._drain, daemon=True)
+            self._reader.start()
+        else:
+            fd, self._temp_path = tempfile.mkstemp(suffix=".mp4")
+            os.close(fd)
+            self._writer = cv2.VideoWriter(self._temp_path, cv2.VideoWriter_fourcc(*'MP4V'), fps, (width, height))
+    
+    def _drain(self):
+        for chunk in iter(lambda: self._proc.stdout.read(1 << 16), b""):
+            self._chunks.append(chunk)
+    
+    def write(self, frame):
+        """Encode the next frame"""
+        if self._proc:
+            self._proc.stdin.write(cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420).data)
+        else:
+            self._writer.write(frame)
+    
+    def finish(self):
+        """Flush the encoder and return the video bytes, or None if encoding failed"""
+        if self._proc:
+            self._proc.stdin.close()
+            self._reader.join()
+            if self._proc.wait() != 0:
+                logger.error(f"ffmpeg exited with status {self._proc.returncode}")
+                return None
+            return b"".join(self._chunks)
+        
+        self._writer.release()
+        with open(self._temp_path, "rb") as f:
+            return f.read()
+    
+    def close(self):
+        """Release the encoder, stopping ffmpeg and removing the temp file if still present"""
+        if self._proc and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if self._writer is not None:
+            self._writer.release()
+        if self._temp_path:
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+
+class ParsedParametersMixin:
+    """Memoizes the decoded JSON `parameters` column of a model instance"""
+    
+    @property
+    def parameters_dict(self):
+        """Decoded parameters, re-parsed only when the stored JSON changes"""
+        raw = self.parameters
+        cached = self.__dict__.get('_parameters_cache')
+        if cached is None or cached[0] is not raw:
+            cached = (raw, _json_loads(raw) if raw else {})
+            self.__dict__['_parameters_cache'] = cached
+        return cached[1]
+
+class AIMediaModel(ParsedParametersMixin, Base):
     """Model representing an AI model for media generation"""
     __tablename__ = 'ai_media_models'
     
+    # Columns exposed by to_dict, in order
+    DICT_FIELDS = ('id', 'name', 'type', 'provider', 'endpoint_url', 'api_key_required',
+                   'description', 'is_local', 'is_enabled', 'parameters')
+    
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)  # image, video
@@ -67,22 +526,28 @@ class AIMediaModel(Base):
     
     def to_dict(self):
         """Convert to dictionary"""
-        return {
-            'id': self.id,
-            'name': self.name,
-            'type': self.type,
-            'provider': self.provider,
-            'endpoint_url': self.endpoint_url,
-            'api_key_required': self.api_key_required,
-            'description': self.description,
-            'is_local': self.is_local,
-            'is_enabled': self.is_enabled,
-            'parameters': json.loads(self.parameters) if self.parameters else {}
-        }
+        data = {field: getattr(self, field) for field in AIMediaModel.DICT_FIELDS}
+        data['parameters'] = self.parameters_dict
+        return data
+    
+    @staticmethod
+    def row_to_dict(row):
+        """Convert an instance or a row of DICT_FIELDS columns to a dictionary"""
+        data = {field: getattr(row, field) for field in AIMediaModel.DICT_FIELDS}
+        data['parameters'] = _json_loads(data['parameters']) if data['parameters'] else {}
+        return data
 
-class AIGeneratedMedia(Base):
+class AIGeneratedMedia(ParsedParametersMixin, Base):
     """Model representing an AI-generated media item (image or video)"""
     __tablename__ = 'ai_generated_media'
+    __table_args__ = (
+        # Serves filtered, newest-first listings; scanned backwards for created_at DESC
+        Index('ix_ai_generated_media_type_status_created', 'media_type', 'status', 'created_at'),
+    )
+    
+    # Fields exposed by to_dict, in order, before the thumbnail and creation time
+    DICT_FIELDS = ('id', 'media_type', 'prompt', 'negative_prompt', 'model_id', 'model_name', 'file_id',
+                   'file_path', 'parameters', 'width', 'height', 'seed', 'duration', 'generation_time', 'status')
     
     id = Column(Integer, primary_key=True)
     media_type = Column(String, nullable=False)  # image, video
@@ -96,8 +561,9 @@ class AIGeneratedMedia(Base):
     seed = Column(Integer)
     duration = Column(Float)  # For videos
     generation_time = Column(Float)  # In seconds
-    status = Column(String)  # pending, generating, completed, failed
-    thumbnail = Column(LargeBinary)  # Small preview image
+    status = Column(String)  # pending (until the result is committed), completed, failed
+    thumbnail = deferred(Column(LargeBinary))  # Small preview image (older rows; newer ones use thumbnail_path)
+    thumbnail_path = Column(String)  # Preview image file stored next to the media file
     
     # Relationships
     model = relationship("AIMediaModel")
@@ -109,31 +575,30 @@ class AIGeneratedMedia(Base):
     def __repr__(self):
         return f"<AIGeneratedMedia(id={self.id}, type='{self.media_type}')>"
     
+    @property
+    def model_name(self):
+        return self.model.name if self.model else None
+    
+    @property
+    def file_path(self):
+        return self.file.path if self.file else None
+    
     def to_dict(self):
         """Convert to dictionary"""
-        thumbnail_b64 = None
-        if self.thumbnail:
-            thumbnail_b64 = base64.b64encode(self.thumbnail).decode('utf-8')
-            
-        return {
-            'id': self.id,
-            'media_type': self.media_type,
-            'prompt': self.prompt,
-            'negative_prompt': self.negative_prompt,
-            'model_id': self.model_id,
-            'model_name': self.model.name if self.model else None,
-            'file_id': self.file_id,
-            'file_path': self.file.path if self.file else None,
-            'parameters': json.loads(self.parameters) if self.parameters else {},
-            'width': self.width,
-            'height': self.height,
-            'seed': self.seed,
-            'duration': self.duration,
-            'generation_time': self.generation_time,
-            'status': self.status,
-            'thumbnail_b64': thumbnail_b64,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        return AIGeneratedMedia.row_to_dict(self, self.parameters_dict)
+    
+    @staticmethod
+    def row_to_dict(row, parameters=None):
+        """Convert an instance, or a row with DICT_FIELDS plus the thumbnail and created_at columns, to a dictionary"""
+        data = {field: getattr(row, field) for field in AIGeneratedMedia.DICT_FIELDS}
+        if parameters is None:
+            parameters = _json_loads(data['parameters']) if data['parameters'] else {}
+        data['parameters'] = parameters
+        
+        thumbnail_data = _load_thumbnail(row)
+        data['thumbnail_b64'] = base64.b64encode(thumbnail_data).decode('utf-8') if thumbnail_data else None
+        data['created_at'] = row.created_at.isoformat() if row.created_at else None
+        return data
 
 class AIMediaGenerator:
     """Manager for AI-generated media (images and videos)"""
@@ -141,16 +606,68 @@ class AIMediaGenerator:
     def __init__(self, ollama_url=None):
         """Initialize the AI media generator"""
         self.ollama_url = ollama_url or os.environ.get("OLLAMA_URL", DEFAULT_OLLAMA_URL)
-        # Track the available endpoints
+        
+        # Reuse keep-alive connections to the Ollama endpoints across probes and generations
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Connection': 'keep-alive',
+            'Accept-Encoding': 'gzip, deflate'
+        })
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Media tables are defined here, after the database connected, so bring
+        # existing ones up to date with columns added since they were created
+        if db_manager.is_connected:
+            try:
+                db_manager.add_missing_columns([AIMediaModel.__table__, AIGeneratedMedia.__table__])
+            except SQLAlchemyError as e:
+                logger.error(f"Error adding missing media table columns: {e}")
+        
+        # Bounded worker pool for background generations; extra requests queue up
+        self._pool = ThreadPoolExecutor(max_workers=GENERATION_MAX_WORKERS, thread_name_prefix="ai-gen")
+        
+        # Writes large outputs to disk so generation workers can overlap them with other work
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-io")
+        
+        # Single consumer that writes finished videos' records, off the generation workers;
+        # close() drains it, and runs at exit so no written video is left pending
+        self._finalize_queue = queue.Queue()
+        self._finalizer_thread = threading.Thread(target=self._run_finalizer, name="ai-finalize", daemon=True)
+        self._finalizer_thread.start()
+        self._closed = False
+        atexit.register(self.close)
+        
+        # Draws video frame overlays in parallel; OpenCV releases the GIL while drawing
+        self._render_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="ai-render")
+        
+        # Video generator per model provider; external APIs use the demo animation until supported
+        self._video_generators = {
+            "ollama": self._generate_video_ollama,
+            "external": self._generate_video_ollama
+        }
+        
+        # media type -> (expiry time, model dicts) for get_models
+        self._models_cache = {}
+        
+        # LRU of (model name, cache key) -> image bytes, bounded by count and total size
+        self._mem_cache = OrderedDict()
+        self._mem_cache_bytes = 0
+        self._mem_cache_lock = threading.Lock()
+        
+        # Track the available endpoints; they are probed lazily on first use
         self.endpoints = {
             "tier1": {
                 "url": CLOUD_OLLAMA_URL,
-                "available": self._check_endpoint_available(CLOUD_OLLAMA_URL),
+                "available": False,
+                "checked_at": None,
                 "models": TIER1_MODELS
             },
             "tier2": {
                 "url": REMOTE_OLLAMA_URL,
-                "available": self._check_endpoint_available(REMOTE_OLLAMA_URL),
+                "available": False,
+                "checked_at": None,
                 "models": TIER2_MODELS,
                 "learning_enabled": True
             },
@@ -163,14 +680,69 @@ class AIMediaGenerator:
         
         self.initialize_models()
     
+    def close(self):
+        """Stop accepting generations, finish the queued ones and close pooled HTTP connections"""
+        if self._closed:
+            return
+        self._closed = True
+        
+        # Running and queued generations enqueue their finalize jobs before the stop signal
+        self._pool.shutdown(wait=True)
+        self._finalize_queue.put(None)
+        self._finalizer_thread.join()
+        self._io_pool.shutdown(wait=True)
+        self._render_pool.shutdown(wait=True)
+        self.session.close()
+        _close_directory_fds()
+    
+    @contextmanager
+    def _session(self, session=None):
+        """Yield a database session (or None), closing it afterwards unless it was passed in"""
+        if session is not None:
+            yield session
+            return
+        
+        session = db_manager.get_session()
+        if not session:
+            yield None
+            return
+        
+        try:
+            yield session
+        finally:
+            session.close()
+    
     def _check_endpoint_available(self, url):
-        """Check if an endpoint is available"""
+        """Check if an endpoint is reachable by opening a TCP connection to it"""
         try:
-            response = requests.get(f"{url}/api/version", timeout=2)
-            return response.status_code == 200
-        except Exception:
+            parsed = urlparse(url)
+            port = parsed.port or (443 if parsed.scheme == "https" else 80)
+            with socket.create_connection((parsed.hostname, port), timeout=ENDPOINT_PROBE_TIMEOUT):
+                return True
+        except (OSError, ValueError):
             return False
     
+    def _is_available(self, tier):
+        """Check if a tier can be used, probing its endpoint when unchecked or stale"""
+        endpoint = self.endpoints[tier]
+        if not endpoint["url"]:
+            return endpoint["available"]
+        
+        now = time.monotonic()
+        if endpoint["checked_at"] is None or now - endpoint["checked_at"] > ENDPOINT_RECHECK_INTERVAL:
+            # Mark as checked first so concurrent generations don't all re-probe
+            endpoint["checked_at"] = now
+            endpoint["available"] = self._check_endpoint_available(endpoint["url"])
+        
+        return endpoint["available"]
+    
+    def _mark_endpoint_unavailable(self, url):
+        """Mark the tiers served by an endpoint as down until the next recheck"""
+        for endpoint in self.endpoints.values():
+            if endpoint["url"] == url:
+                endpoint["available"] = False
+                endpoint["checked_at"] = time.monotonic()
+    
     def initialize_models(self):
         """Initialize available AI models in the database"""
         session = db_manager.get_session()
@@ -276,12 +848,11 @@ class AIMediaGenerator:
                 }
             ]
             
-            # Add models to database
-            for model_data in models:
-                model = AIMediaModel(**model_data)
-                session.add(model)
+            # Add models to database in a single executemany
+            session.bulk_insert_mappings(AIMediaModel, models)
             
             session.commit()
+            self._models_cache.clear()
             logger.info(f"Added {len(models)} AI media models to database")
         
         except Exception as e:
@@ -293,29 +864,31 @@ class AIMediaGenerator:
     
     def get_models(self, media_type=None):
         """Get all available AI models, optionally filtered by type"""
-        models = []
-        session = db_manager.get_session()
+        cached = self._models_cache.get(media_type)
+        if cached and time.monotonic() < cached[0]:
+            return list(cached[1])
         
-        if not session:
-            return models
-        
-        try:
-            query = session.query(AIMediaModel)
+        models = []
+        with self._session() as session:
+            if not session:
+                return models
             
-            if media_type:
-                query = query.filter_by(type=media_type)
+            try:
+                # Select plain columns rather than hydrating ORM instances
+                query = session.query(*(getattr(AIMediaModel, field) for field in AIMediaModel.DICT_FIELDS))
+                
+                if media_type:
+                    query = query.filter(AIMediaModel.type == media_type)
+                    
+                query = query.filter(AIMediaModel.is_enabled == True)
+                models = [AIMediaModel.row_to_dict(row) for row in query.all()]
                 
-            query = query.filter_by(is_enabled=True)
-            models = [model.to_dict() for model in query.all()]
+                self._models_cache[media_type] = (time.monotonic() + MODEL_LIST_CACHE_TTL, models)
+                return list(models)
             
-            return models
-        
-        except Exception as e:
-            logger.error(f"Error getting AI models: {e}")
-            return models
-        
-        finally:
-            session.close()
+            except Exception as e:
+                logger.error(f"Error getting AI models: {e}")
+                return models
     
     def generate_image(self, prompt, model_name=None, negative_prompt=None, width=None, height=None, 
                       seed=None, parameters=None, save_path=None):
@@ -361,13 +934,8 @@ class AIMediaGenerator:
             session.commit()
             media_id = media.id
             
-            # Start generation in a separate thread
-            thread = threading.Thread(
-                target=self._generate_image_thread,
-                args=(media_id, model, params, save_path)
-            )
-            thread.daemon = True
-            thread.start()
+            # Queue generation on the worker pool
+            self._pool.submit(self._generate_image_thread, media_id, model, params, save_path)
             
             return {
                 "success": True,
@@ -393,57 +961,52 @@ class AIMediaGenerator:
         start_time = time.time()
         
         try:
-            # Update status to generating
+            # The record stays "pending" until the single final commit below;
+            # pending with no file means the generation is still in progress
             media = session.query(AIGeneratedMedia).get(media_id)
             if not media:
                 logger.error(f"Media record {media_id} not found")
                 return
             
-            media.status = "generating"
-            session.commit()
-            
             # Generate the image using tiered approach with fallback
-            image_data, source_tier = self._generate_image_tiered(model, params)
+            image_data, source_tier = self._generate_image_tiered(model, params, session)
             
             if not image_data:
                 raise Exception("Failed to generate image after trying all tiers")
             
-            # Create thumbnail
-            img = Image.open(io.BytesIO(image_data))
-            thumbnail_size = (256, 256)
-            thumbnail = img.copy()
-            thumbnail.thumbnail(thumbnail_size)
-            thumbnail_buffer = io.BytesIO()
-            thumbnail.save(thumbnail_buffer, format="JPEG")
-            thumbnail_data = thumbnail_buffer.getvalue()
-            
             # Save the image if requested
             if not save_path:
                 # Create a default path in the user's directory
                 save_dir = os.path.join("generated_media/images")
-                os.makedirs(save_dir, exist_ok=True)
                 filename = f"img_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{media_id}.png"
                 save_path = os.path.join(save_dir, filename)
             
             # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+            _ensure_dir(os.path.dirname(os.path.abspath(save_path)))
             
-            # Save the image
-            with open(save_path, "wb") as f:
-                f.write(image_data)
+            # Save the image, then drop the encoded bytes before decoding
+            # the saved file for the thumbnail to keep peak memory down
+            image_hash = _write_file(save_path, image_data, digest=True)
+            image_size = len(image_data)
+            del image_data
+            
+            # Create thumbnail and store it next to the image
+            thumbnail_data = _make_thumbnail(save_path)
+            thumbnail_path = _thumbnail_path(save_path, thumbnail_data)
+            _write_file(thumbnail_path, thumbnail_data)
             
             # Create a file record in the database
             file_record = File(
                 path=save_path,
                 name=os.path.basename(save_path),
                 extension=os.path.splitext(save_path)[1],
-                size=len(image_data),
+                size=image_size,
                 is_directory=False,
                 file_type="image",
                 created_time=datetime.datetime.now(),
                 modified_time=datetime.datetime.now(),
                 accessed_time=datetime.datetime.now(),
-                hash_value=""  # Could add hash calculation here if needed
+                hash_value=image_hash
             )
             
             session.add(file_record)
@@ -454,7 +1017,7 @@ class AIMediaGenerator:
             media.status = "completed"
             media.file_id = file_record.id
             media.generation_time = generation_time
-            media.thumbnail = thumbnail_data
+            media.thumbnail_path = thumbnail_path
             
             session.commit()
             logger.info(f"Image generation completed. Media ID: {media_id}, File: {save_path}")
@@ -476,16 +1039,16 @@ class AIMediaGenerator:
         finally:
             session.close()
     
-    def _generate_image_tiered(self, model, params):
-        """Generate an image using tiered approach with fallback"""
+    def _generate_image_tiered(self, model, params, session=None):
+        """Generate an image using tiered approach with fallback, reusing session for cache access if given"""
         # First check for cached results from previous generations
-        cached_result = self._check_ollama_model_cache(model["name"], params)
+        cached_result = self._check_ollama_model_cache(model["name"], params, session)
         if cached_result:
             logger.info(f"Using cached result for prompt: {params['prompt'][:30]}...")
             return cached_result, None
         
         # Step 1: Try lightweight cloud-hosted Ollama model (Tier 1)
-        if any(model["name"] in tier1_model for tier1_model in TIER1_MODELS) and self.endpoints["tier1"]["available"]:
+        if model["name"] in TIER1_BASE and self._is_available("tier1"):
             logger.info(f"Trying Tier 1 (Cloud Ollama) for model {model['name']}")
             image_data = self._generate_image_with_endpoint(
                 self.endpoints["tier1"]["url"], 
@@ -496,15 +1059,12 @@ class AIMediaGenerator:
                 return image_data, None
         
         # Step 2: Try laptop-hosted Ollama model with learning capabilities (Tier 2)
-        if self.endpoints["tier2"]["available"]:
+        if self._is_available("tier2"):
             logger.info(f"Trying Tier 2 (Remote Laptop Ollama) for model {model['name']}")
             # Use appropriate version of the model for Tier 2
             tier2_model_name = model["name"]
             if ":" not in tier2_model_name:  # If no version specified, use standard version
-                for tier2_model in TIER2_MODELS:
-                    if model["name"] in tier2_model and ":" in tier2_model:
-                        tier2_model_name = tier2_model
-                        break
+                tier2_model_name = TIER2_BY_BASE.get(tier2_model_name, tier2_model_name)
             
             image_data = self._generate_image_with_endpoint(
                 self.endpoints["tier2"]["url"], 
@@ -514,7 +1074,7 @@ class AIMediaGenerator:
             if image_data:
                 # Store in cache for learning if enabled
                 if self.endpoints["tier2"]["learning_enabled"]:
-                    self._store_in_ollama_model_cache(tier2_model_name, params, image_data)
+                    self._store_in_ollama_model_cache(tier2_model_name, params, image_data, session)
                 return image_data, None
         
         # Step 3: Try external API (Tier 3)
@@ -552,30 +1112,60 @@ class AIMediaGenerator:
                 "height": params["height"],
                 "steps": params.get("steps", 30),
                 "seed": params["seed"],
-                "guidance_scale": params.get("guidance_scale", 7.5)
+                "guidance_scale": params.get("guidance_scale", 7.5),
+                "stream": True
             }
             
             # In a real implementation with actual Ollama endpoints:
             try:
-                response = requests.post(api_url, json=request_data, timeout=60)
-                if response.status_code == 200:
+                # Stream so a non-image or error body is never downloaded, and so
+                # slow generations are bounded by the gap between chunks rather
+                # than the total time
+                with self.session.post(api_url, json=request_data, timeout=(5, 300), stream=True) as response:
+                    if response.status_code != 200:
+                        logger.error(f"API error: {response.status_code}")
+                        return None
+                    
                     content_type = response.headers.get("Content-Type", "")
                     if "image" in content_type:
-                        return response.content
-                    else:
-                        return None
-                else:
-                    logger.error(f"API error: {response.status_code}")
+                        return b"".join(response.iter_content(64 * 1024))
+                    if "json" in content_type:
+                        return self._read_streamed_image(response, model_name)
                     return None
-            except requests.exceptions.RequestException:
-                # For demonstration purposes, instead of failing, generate a placeholder
-                # in a real implementation, we would return None here to try the next tier
-                return self._generate_placeholder_image(params["prompt"], params["width"], params["height"])
+            except requests.exceptions.RequestException as e:
+                if isinstance(e, requests.exceptions.ConnectionError):
+                    self._mark_endpoint_unavailable(endpoint_url)
+                
+                # Let _generate_image_tiered fall through to the next tier
+                logger.warning(f"Request to {endpoint_url} failed: {e}")
+                return None
                 
         except Exception as e:
             logger.error(f"Error in image generation with endpoint {endpoint_url}: {e}")
             return None
     
+    def _read_streamed_image(self, response, model_name):
+        """Read an Ollama NDJSON generate stream and decode the final image"""
+        images = []
+        for line in response.iter_lines():
+            if not line:
+                continue
+            
+            chunk = _json_loads(line)
+            if chunk.get("error"):
+                logger.error(f"Generation error from {model_name}: {chunk['error']}")
+                return None
+            
+            if "completed" in chunk and "total" in chunk:
+                logger.debug(f"Generating with {model_name}: step {chunk['completed']}/{chunk['total']}")
+            
+            images.extend(chunk.get("images") or ())
+            if chunk.get("done"):
+                break
+        
+        # Decode only once the stream is finished
+        return base64.b64decode(images[0]) if images else None
+    
     def _generate_image_external_dalle(self, params, api_key):
         """Generate an image using OpenAI's DALL-E API"""
         try:
@@ -595,7 +1185,7 @@ class AIMediaGenerator:
             
             # Download the image
             image_url = response.data[0].url
-            image_response = requests.get(image_url)
+            image_response = self.session.get(image_url)
             if image_response.status_code == 200:
                 return image_response.content
             
@@ -604,99 +1194,159 @@ class AIMediaGenerator:
             logger.error(f"Error in DALL-E image generation: {e}")
             return None
     
-    def _check_ollama_model_cache(self, model_name, params):
+    def _get_mem_cached_image(self, key):
+        """Get image bytes from the in-memory cache, marking them recently used"""
+        with self._mem_cache_lock:
+            image_data = self._mem_cache.get(key)
+            if image_data is not None:
+                self._mem_cache.move_to_end(key)
+            return image_data
+    
+    def _mem_cache_image(self, key, image_data):
+        """Add image bytes to the in-memory cache, evicting least recently used entries"""
+        if len(image_data) > IMAGE_MEMORY_CACHE_MAX_BYTES:
+            return
+        
+        with self._mem_cache_lock:
+            previous = self._mem_cache.pop(key, None)
+            if previous is not None:
+                self._mem_cache_bytes -= len(previous)
+            
+            self._mem_cache[key] = image_data
+            self._mem_cache_bytes += len(image_data)
+            
+            while (len(self._mem_cache) > IMAGE_MEMORY_CACHE_MAX_ENTRIES or
+                    self._mem_cache_bytes > IMAGE_MEMORY_CACHE_MAX_BYTES):
+                _, evicted = self._mem_cache.popitem(last=False)
+                self._mem_cache_bytes -= len(evicted)
+    
+    def _check_ollama_model_cache(self, model_name, params, session=None):
         """Check if we have a cached result for this prompt and parameters"""
-        session = db_manager.get_session()
-        if not session:
-            return None
+        mem_key = (model_name, _cache_key(params))
+        image_data = self._get_mem_cached_image(mem_key)
+        if image_data is not None:
+            logger.info(f"Found in-memory cached image for {model_name} with prompt: {params['prompt'][:30]}...")
+            return image_data
         
-        try:
-            # Create a hash of parameters for lookup
-            param_str = json.dumps({
-                "prompt": params["prompt"],
-                "negative_prompt": params.get("negative_prompt", ""),
-                "width": params["width"],
-                "height": params["height"],
-                "seed": params["seed"]
-            }, sort_keys=True)
-            import hashlib
-            params_hash = hashlib.md5(param_str.encode()).hexdigest()
-            
-            # Look for a matching cache entry
-            cache_entry = session.query(OllamaModelCache).filter_by(
-                model_name=model_name,
-                result_hash=params_hash,
-                media_type="image"
-            ).first()
-            
-            if cache_entry and cache_entry.result_data:
-                logger.info(f"Found cached image for {model_name} with prompt: {params['prompt'][:30]}...")
-                return cache_entry.result_data
+        with self._session(session) as session:
+            if not session:
+                return None
             
+            try:
+                # Look for a matching cache entry, including ones keyed before
+                # the switch from MD5 to BLAKE2b
+                cache_entry = session.query(OllamaModelCache.result_path, OllamaModelCache.result_data).filter(
+                    OllamaModelCache.model_name == model_name,
+                    OllamaModelCache.result_hash.in_([_cache_key(params), _legacy_cache_key(params)]),
+                    OllamaModelCache.media_type == "image"
+                ).first()
+                
+                image_data = _read_cache_entry(cache_entry) if cache_entry else None
+                if image_data:
+                    logger.info(f"Found cached image for {model_name} with prompt: {params['prompt'][:30]}...")
+                    self._mem_cache_image(mem_key, image_data)
+                    return image_data
+                
+                # Fall back to a cached image for a near-identical prompt
+                image_data = self._find_similar_cached_image(session, model_name, params)
+                if image_data:
+                    logger.info(f"Found cached image for a similar prompt for {model_name}: {params['prompt'][:30]}...")
+                    self._mem_cache_image(mem_key, image_data)
+                return image_data
+            
+            except Exception as e:
+                logger.error(f"Error checking Ollama model cache: {e}")
+                return None
+    
+    def _find_similar_cached_image(self, session, model_name, params):
+        """Find a cached image whose prompt embedding is close to this prompt's"""
+        query_embedding = _embed_prompt(params["prompt"])
+        if query_embedding is None:
             return None
         
-        except Exception as e:
-            logger.error(f"Error checking Ollama model cache: {e}")
+        # Only the prompt may differ: model, size, seed and negative prompt must all match
+        candidates = session.query(
+            OllamaModelCache.id, OllamaModelCache.prompt_embedding, OllamaModelCache.parameters
+        ).filter(
+            OllamaModelCache.model_name == model_name,
+            OllamaModelCache.media_type == "image",
+            OllamaModelCache.width == params["width"],
+            OllamaModelCache.height == params["height"],
+            OllamaModelCache.seed == params["seed"],
+            OllamaModelCache.prompt_embedding.isnot(None)
+        ).order_by(OllamaModelCache.id.desc()).limit(SEMANTIC_CACHE_CANDIDATES).all()
+        
+        negative_prompt = params.get("negative_prompt", "")
+        candidates = [(entry_id, embedding) for entry_id, embedding, parameters in candidates
+                      if len(embedding) == query_embedding.nbytes
+                      and _json_loads(parameters).get("negative_prompt", "") == negative_prompt]
+        if not candidates:
             return None
         
-        finally:
-            session.close()
+        # Embeddings are unit length, so the dot product is the cosine similarity
+        embeddings = np.frombuffer(b"".join(embedding for _, embedding in candidates), dtype=np.float32)
+        similarities = embeddings.reshape(len(candidates), -1) @ query_embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        
+        entry = session.query(OllamaModelCache.result_path, OllamaModelCache.result_data).filter_by(
+            id=candidates[best][0]
+        ).first()
+        return _read_cache_entry(entry) if entry else None
     
-    def _store_in_ollama_model_cache(self, model_name, params, result_data):
+    def _store_in_ollama_model_cache(self, model_name, params, result_data, session=None):
         """Store a result in the Ollama model cache for learning"""
-        session = db_manager.get_session()
-        if not session:
-            return
-        
-        try:
-            # Create a hash of parameters for lookup
-            param_str = json.dumps({
-                "prompt": params["prompt"],
-                "negative_prompt": params.get("negative_prompt", ""),
-                "width": params["width"],
-                "height": params["height"],
-                "seed": params["seed"]
-            }, sort_keys=True)
-            import hashlib
-            params_hash = hashlib.md5(param_str.encode()).hexdigest()
+        with self._session(session) as session:
+            if not session:
+                return
             
-            # Create a thumbnail
             try:
-                img = Image.open(io.BytesIO(result_data))
-                thumbnail_size = (256, 256)
-                thumbnail = img.copy()
-                thumbnail.thumbnail(thumbnail_size)
-                thumbnail_buffer = io.BytesIO()
-                thumbnail.save(thumbnail_buffer, format="JPEG")
-                thumbnail_data = thumbnail_buffer.getvalue()
+                # Create a hash of parameters for lookup
+                params_hash = _cache_key(params)
+                
+                # Create a thumbnail
+                try:
+                    thumbnail_data = _make_thumbnail(result_data)
+                except Exception as e:
+                    logger.error(f"Error creating thumbnail: {e}")
+                    thumbnail_data = None
+                
+                # Keep the image on disk rather than as a database blob, falling
+                # back to the blob column if the cache directory isn't writable
+                try:
+                    result_path, stored_data = _write_cache_file(result_data), None
+                except OSError as e:
+                    logger.warning(f"Could not write image cache file, storing in database: {e}")
+                    result_path, stored_data = None, result_data
+                
+                # Create a new cache entry
+                cache_entry = OllamaModelCache(
+                    model_name=model_name,
+                    prompt=params["prompt"],
+                    parameters=json.dumps(params),
+                    result_hash=params_hash,
+                    result_data=stored_data,
+                    result_path=result_path,
+                    thumbnail=thumbnail_data,
+                    media_type="image",
+                    width=params["width"],
+                    height=params["height"],
+                    seed=params["seed"]
+                )
+                
+                prompt_embedding = _embed_prompt(params["prompt"])
+                if prompt_embedding is not None:
+                    cache_entry.prompt_embedding = prompt_embedding.tobytes()
+                
+                session.add(cache_entry)
+                session.commit()
+                self._mem_cache_image((model_name, params_hash), result_data)
+                logger.info(f"Stored result in Ollama model cache: {model_name}, hash: {params_hash}")
+                
             except Exception as e:
-                logger.error(f"Error creating thumbnail: {e}")
-                thumbnail_data = None
-            
-            # Create a new cache entry
-            cache_entry = OllamaModelCache(
-                model_name=model_name,
-                prompt=params["prompt"],
-                parameters=json.dumps(params),
-                result_hash=params_hash,
-                result_data=result_data,
-                thumbnail=thumbnail_data,
-                media_type="image",
-                width=params["width"],
-                height=params["height"],
-                seed=params["seed"]
-            )
-            
-            session.add(cache_entry)
-            session.commit()
-            logger.info(f"Stored result in Ollama model cache: {model_name}, hash: {params_hash}")
-            
-        except Exception as e:
-            logger.error(f"Error storing in Ollama model cache: {e}")
-            session.rollback()
-        
-        finally:
-            session.close()
+                logger.error(f"Error storing in Ollama model cache: {e}")
+                session.rollback()
     
     def generate_video(self, prompt, model_name=None, negative_prompt=None, width=None, height=None,
                        duration=None, fps=None, seed=None, parameters=None, save_path=None):
@@ -745,13 +1395,8 @@ class AIMediaGenerator:
             session.commit()
             media_id = media.id
             
-            # Start generation in a separate thread
-            thread = threading.Thread(
-                target=self._generate_video_thread,
-                args=(media_id, model, params, save_path)
-            )
-            thread.daemon = True
-            thread.start()
+            # Queue generation on the worker pool
+            self._pool.submit(self._generate_video_thread, media_id, model, params, save_path)
             
             return {
                 "success": True,
@@ -775,88 +1420,136 @@ class AIMediaGenerator:
             return
         
         start_time = time.time()
+        media = None
         
         try:
-            # Update status to generating
-            media = session.query(AIGeneratedMedia).get(media_id)
+            # As with images, the record stays "pending" until the final commit;
+            # ending the read transaction keeps no connection idle in one during the encode
+            media = session.get(AIGeneratedMedia, media_id)
             if not media:
                 logger.error(f"Media record {media_id} not found")
                 return
             
-            media.status = "generating"
             session.commit()
             
-            # Select the appropriate generator based on the model
-            if model["provider"] == "ollama":
-                video_data, thumbnail_frame = self._generate_video_ollama(model, params)
-            else:
-                # For future external API support
-                video_data, thumbnail_frame = self._generate_video_external(model, params)
+            # Select the appropriate generator based on the model's provider
+            generator = self._video_generators.get(model["provider"], self._generate_video_ollama)
+            video_data, thumbnail_frame = generator(model, params)
             
             if not video_data:
                 raise Exception("Failed to generate video")
             
-            # Create thumbnail from the first frame
-            if thumbnail_frame is not None:
-                # Convert the frame to JPEG
-                _, thumbnail_data = cv2.imencode('.jpg', thumbnail_frame)
-                thumbnail_data = thumbnail_data.tobytes()
-            else:
-                # Create a placeholder thumbnail
-                thumbnail_img = self._generate_placeholder_image(params["prompt"], 256, 256)
-                thumbnail_data = thumbnail_img
-            
             # Save the video if requested
             if not save_path:
                 # Create a default path in the user's directory
                 save_dir = os.path.join("/home/user/generated_media/videos")
-                os.makedirs(save_dir, exist_ok=True)
                 filename = f"vid_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{media_id}.mp4"
                 save_path = os.path.join(save_dir, filename)
             
             # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+            _ensure_dir(os.path.dirname(os.path.abspath(save_path)))
+            
+            # Save the video on the I/O pool while the thumbnail and file record are prepared
+            write_future = self._io_pool.submit(_write_file, save_path, video_data, True)
+            
+            # Create thumbnail from the first frame
+            if thumbnail_frame is not None:
+                # Convert the frame to JPEG, then release the full-resolution frame
+                # rather than holding it until the database commit
+                thumbnail_data = _encode_jpeg(thumbnail_frame)
+                del thumbnail_frame
+            else:
+                # Create a placeholder thumbnail
+                thumbnail_img = self._generate_placeholder_image(params["prompt"], 256, 256)
+                thumbnail_data = thumbnail_img
+            
+            # Store the thumbnail next to the video
+            thumbnail_path = _thumbnail_path(save_path, thumbnail_data)
+            thumbnail_future = self._io_pool.submit(_write_file, thumbnail_path, thumbnail_data)
+            
+            # Hand the file record and final commit to the finalizer thread so this
+            # worker can start on the next generation
+            generation_time = time.time() - start_time
+            self._finalize_queue.put((media_id, save_path, len(video_data), write_future,
+                                      thumbnail_path, thumbnail_future, generation_time))
+            
+        except Exception as e:
+            logger.error(f"Error generating video: {e}")
+            
+            # Update the media record with failure status, reusing the loaded record
+            try:
+                session.rollback()
+                if media:
+                    media.status = "failed"
+                    media.generation_time = time.time() - start_time
+                    session.commit()
+            except Exception as commit_error:
+                logger.error(f"Error updating media record: {commit_error}")
+                session.rollback()
+        
+        finally:
+            session.close()
+    
+    def _run_finalizer(self):
+        """Finalize queued videos one at a time until close() sends the stop signal"""
+        while True:
+            job = self._finalize_queue.get()
+            if job is None:
+                return
+            self._finalize_video(*job)
+    
+    def _finalize_video(self, media_id, save_path, size, write_future, thumbnail_path, thumbnail_future,
+                        generation_time):
+        """Record a written video in the database and mark its media record completed"""
+        session = db_manager.get_session()
+        if not session:
+            logger.error(f"Could not get database session for media_id {media_id}")
+            return
+        
+        try:
+            # Only record the files once they are fully on disk
+            hash_value = write_future.result()
+            thumbnail_future.result()
             
-            # Save the video
-            with open(save_path, "wb") as f:
-                f.write(video_data)
+            media = session.get(AIGeneratedMedia, media_id)
+            if not media:
+                logger.error(f"Media record {media_id} not found")
+                return
             
             # Create a file record in the database
+            now = datetime.datetime.now()
             file_record = File(
                 path=save_path,
                 name=os.path.basename(save_path),
                 extension=os.path.splitext(save_path)[1],
-                size=len(video_data),
+                size=size,
                 is_directory=False,
                 file_type="video",
-                created_time=datetime.datetime.now(),
-                modified_time=datetime.datetime.now(),
-                accessed_time=datetime.datetime.now(),
-                hash_value=""  # Could add hash calculation here if needed
+                created_time=now,
+                modified_time=now,
+                accessed_time=now,
+                hash_value=hash_value
             )
             
-            session.add(file_record)
-            session.flush()  # Get the file ID
-            
-            # Update the media record
-            generation_time = time.time() - start_time
+            # Update the media record; the file row is inserted in the same commit
             media.status = "completed"
-            media.file_id = file_record.id
+            media.file = file_record
             media.generation_time = generation_time
-            media.thumbnail = thumbnail_data
+            media.thumbnail_path = thumbnail_path
             
             session.commit()
             logger.info(f"Video generation completed. Media ID: {media_id}, File: {save_path}")
             
         except Exception as e:
-            logger.error(f"Error generating video: {e}")
+            logger.error(f"Error finalizing video: {e}")
             
             # Update the media record with failure status
             try:
-                media = session.query(AIGeneratedMedia).get(media_id)
+                session.rollback()
+                media = session.get(AIGeneratedMedia, media_id)
                 if media:
                     media.status = "failed"
-                    media.generation_time = time.time() - start_time
+                    media.generation_time = generation_time
                     session.commit()
             except Exception as commit_error:
                 logger.error(f"Error updating media record: {commit_error}")
@@ -878,52 +1571,39 @@ class AIMediaGenerator:
             
             if model["name"] in ["zeroscope", "animatediff"]:
                 # Create a simple animation video
-                fourcc = cv2.VideoWriter_fourcc(*'MP4V')
-                temp_video_path = f"/tmp/temp_video_{int(time.time())}.mp4"
-                video_writer = cv2.VideoWriter(temp_video_path, fourcc, fps, (width, height))
-                
-                frames = []
-                
-                # Generate some colorful frames with text
-                for i in range(num_frames):
-                    # Create a gradient background
-                    frame = np.zeros((height, width, 3), dtype=np.uint8)
-                    
-                    # Create a moving gradient based on frame number
-                    for y in range(height):
-                        for x in range(width):
-                            frame[y, x, 0] = (x + i * 5) % 255  # Blue channel
-                            frame[y, x, 1] = (y + i * 3) % 255  # Green channel
-                            frame[y, x, 2] = ((x + y) // 2 + i * 7) % 255  # Red channel
+                video_encoder = _VideoEncoder(width, height, fps)
+                try:
+                    first_frame = None
                     
-                    # Add text with the prompt
+                    # Wrap the prompt to fit in the frame once; it is the same on every frame
                     font = cv2.FONT_HERSHEY_SIMPLEX
-                    # Wrap text to fit in frame
                     lines = self._wrap_text(params["prompt"], width, font, 1, 2)
+                    text_rows = [(line, (30, 50 + j * 40)) for j, line in enumerate(lines)]
+                    draw_text = functools.partial(_draw_frame_text, text_rows=text_rows, font=font,
+                                                  caption_position=(30, height - 30))
                     
-                    for j, line in enumerate(lines):
-                        y_position = 50 + j * 40
-                        cv2.putText(frame, line, (30, y_position), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
+                    # Generate some colorful frames with text, a batch at a time into one reused buffer
+                    frame_buffer = np.empty((min(VIDEO_RENDER_BATCH, num_frames), height, width, 3), dtype=np.uint8)
+                    for start in range(0, num_frames, VIDEO_RENDER_BATCH):
+                        # Create moving gradients based on frame number
+                        batch = frame_buffer[:min(VIDEO_RENDER_BATCH, num_frames - start)]
+                        _render_gradient_frames(batch, start)
+                        
+                        # Add the prompt and frame number to the whole batch in parallel
+                        captions = [f"Frame: {i+1}/{num_frames}" for i in range(start, start + len(batch))]
+                        list(self._render_pool.map(draw_text, batch, captions))
+                        
+                        # Keep a copy of the first frame for the thumbnail; the buffer is overwritten
+                        if first_frame is None:
+                            first_frame = batch[0].copy()
+                        
+                        for frame in batch:
+                            video_encoder.write(frame)
                     
-                    # Add frame number
-                    cv2.putText(frame, f"Frame: {i+1}/{num_frames}", (30, height - 30), font, 0.7, (255, 255, 255), 1, cv2.LINE_AA)
-                    
-                    frames.append(frame)
-                    video_writer.write(frame)
-                
-                video_writer.release()
-                
-                # Read the video data
-                with open(temp_video_path, "rb") as f:
-                    video_data = f.read()
-                
-                # Clean up the temporary file
-                try:
-                    os.remove(temp_video_path)
-                except:
-                    pass
-                
-                return video_data, frames[0] if frames else None
+                    video_data = video_encoder.finish()
+                    return video_data, first_frame
+                finally:
+                    video_encoder.close()
             
             else:
                 logger.error(f"Unsupported model: {model['name']}")
@@ -933,17 +1613,6 @@ class AIMediaGenerator:
             logger.error(f"Error in Ollama video generation: {e}")
             return None, None
     
-    def _generate_video_external(self, model, params):
-        """Generate a video using external API"""
-        try:
-            # This would implement calls to external APIs
-            # For demonstration, generate a simple animation video (same as Ollama method)
-            return self._generate_video_ollama(model, params)
-            
-        except Exception as e:
-            logger.error(f"Error in external video generation: {e}")
-            return None, None
-    
     def get_generated_media(self, media_id=None, media_type=None, status=None, limit=20, offset=0):
         """Get generated media items from the database"""
         media_items = []
@@ -953,24 +1622,37 @@ class AIMediaGenerator:
             return media_items
         
         try:
-            query = session.query(AIGeneratedMedia)
+            # Select plain columns, joining the model name and file path, rather than hydrating ORM instances
+            columns = [getattr(AIGeneratedMedia, field) for field in AIGeneratedMedia.DICT_FIELDS
+                       if field not in ('model_name', 'file_path')]
+            # The thumbnail blob is only read for older rows without a thumbnail file
+            legacy_thumbnail = case(
+                (AIGeneratedMedia.thumbnail_path.is_(None), AIGeneratedMedia.thumbnail), else_=None
+            ).label('thumbnail')
+            stmt = (select(*columns, AIGeneratedMedia.thumbnail_path, legacy_thumbnail,
+                           AIGeneratedMedia.created_at, AIMediaModel.name.label('model_name'),
+                           File.path.label('file_path'))
+                    .outerjoin(AIMediaModel, AIGeneratedMedia.model_id == AIMediaModel.id)
+                    .outerjoin(File, AIGeneratedMedia.file_id == File.id))
             
             if media_id:
-                query = query.filter_by(id=media_id)
+                stmt = stmt.where(AIGeneratedMedia.id == media_id)
             
             if media_type:
-                query = query.filter_by(media_type=media_type)
+                stmt = stmt.where(AIGeneratedMedia.media_type == media_type)
                 
             if status:
-                query = query.filter_by(status=status)
+                stmt = stmt.where(AIGeneratedMedia.status == status)
             
             # Order by creation date (newest first)
-            query = query.order_by(AIGeneratedMedia.created_at.desc())
+            stmt = stmt.order_by(AIGeneratedMedia.created_at.desc())
             
-            # Apply pagination
-            query = query.limit(limit).offset(offset)
+            # Apply pagination, streaming the page's rows straight into dicts
+            stmt = stmt.limit(limit).offset(offset)
+            if limit:
+                stmt = stmt.execution_options(yield_per=limit)
             
-            media_items = [media.to_dict() for media in query.all()]
+            media_items = [AIGeneratedMedia.row_to_dict(row) for row in session.execute(stmt)]
             
             return media_items
         
@@ -1024,14 +1706,8 @@ class AIMediaGenerator:
     
     def _generate_placeholder_image(self, prompt, width, height):
         """Generate a placeholder image with the prompt text (for demonstration)"""
-        img = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Create a gradient background
-        for y in range(height):
-            for x in range(width):
-                img[y, x, 0] = int(255 * (x / width))  # Blue channel
-                img[y, x, 1] = int(255 * (y / height))  # Green channel
-                img[y, x, 2] = int(255 * 0.5 * ((x / width) + (y / height)))  # Red channel
+        # Start from the gradient background shared by every placeholder of this size
+        img = _placeholder_gradient(width, height).copy()
         
         # Add text with the prompt
         font = cv2.FONT_HERSHEY_SIMPLEX
@@ -1055,30 +1731,7 @@ class AIMediaGenerator:
     
     def _wrap_text(self, text, width, font, font_scale, thickness):
         """Wrap text to fit within a given width"""
-        words = text.split(' ')
-        lines = []
-        current_line = ""
-        
-        for word in words:
-            # Test if adding this word would exceed the width
-            test_line = current_line + word + " "
-            size = cv2.getTextSize(test_line, font, font_scale, thickness)[0]
-            
-            if size[0] > width - 60:  # 60 pixels margin
-                lines.append(current_line)
-                current_line = word + " "
-            else:
-                current_line = test_line
-        
-        if current_line:
-            lines.append(current_line)
-        
-        # Limit to a maximum of 5 lines
-        if len(lines) > 5:
-            lines = lines[:4]
-            lines.append("...")
-        
-        return lines
+        return list(_wrapped_lines(text, width, font, font_scale, thickness))
 
 # Create a singleton instance
 ai_media_generator = AIMediaGenerator()
\ No newline at end of file
@@ -3,19 +3,31 @@ APK Analyzer module for Drive-Manager Pro.
 Provides in-depth APK analysis, extraction, and management functionality.
 """
 
+import io
 import os
 import re
 import time
+import atexit
 import tempfile
 import zipfile
-import shutil
+import struct
 import json
 import hashlib
+import logging
 import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-import xml.etree.ElementTree as ET
 
 # Optional imports - will be used if available
+try:
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
 try:
     from PIL import Image
     PIL_AVAILABLE = True
@@ -29,6 +41,317 @@ try:
 except ImportError:
     ANDROGUARD_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+# Read size for the pure-Python hashing fallback
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Number of (path, mtime, size) -> digest entries kept in memory
+HASH_CACHE_MAX_ENTRIES = 512
+
+# Workers for decoding app icons while the package is parsed, shared by concurrent analyses
+ANALYSIS_MAX_WORKERS = 3
+
+# Seconds between batched writes of pending analysis results to the JSON cache
+CACHE_FLUSH_INTERVAL = 5
+
+# Single-pass matcher for `aapt dump badging` output; each alternative's
+# group name says which field the match fills in
+_AAPT_BADGING_RE = re.compile(
+    r"package: name='(?P<package_name>[^']+)'"
+    r"|versionName='(?P<version_name>[^']+)'"
+    r"|versionCode='(?P<version_code>\d+)'"
+    r"|application-label:'(?P<app_name>[^']+)'"
+    r"|targetSdkVersion:'(?P<target_sdk>\d+)'"
+    r"|sdkVersion:'(?P<min_sdk>\d+)'"
+    r"|uses-permission: name='(?P<permission>[^']+)'"
+    r"|uses-feature: name='(?P<feature>[^']+)'"
+    r"|launchable-activity: name='(?P<activity>[^']+)'"
+)
+
+# Badging fields where only the first occurrence is kept
+_AAPT_SINGLE_FIELDS = frozenset([
+    'package_name', 'version_name', 'version_code', 'app_name', 'min_sdk', 'target_sdk'
+])
+
+# Filename fragments that flag a potentially sensitive file, compiled into one
+# alternation so each name is scanned once
+_SENSITIVE_FILE_PATTERNS = [
+    'password', 'key', 'secret', 'credential', 'token', 'apikey',
+    'firebase', 'google-services.json', '.keystore', '.jks'
+]
+_SENSITIVE_FILE_RE = re.compile('|'.join(map(re.escape, _SENSITIVE_FILE_PATTERNS)))
+
+# Android API level to release version, plus the same pairs sorted by level
+_SDK_TO_VERSION = {
+    '1': '1.0',
+    '2': '1.1',
+    '3': '1.5',
+    '4': '1.6',
+    '5': '2.0',
+    '6': '2.0.1',
+    '7': '2.1',
+    '8': '2.2',
+    '9': '2.3',
+    '10': '2.3.3',
+    '11': '3.0',
+    '12': '3.1',
+    '13': '3.2',
+    '14': '4.0',
+    '15': '4.0.3',
+    '16': '4.1',
+    '17': '4.2',
+    '18': '4.3',
+    '19': '4.4',
+    '21': '5.0',
+    '22': '5.1',
+    '23': '6.0',
+    '24': '7.0',
+    '25': '7.1',
+    '26': '8.0',
+    '27': '8.1',
+    '28': '9.0',
+    '29': '10.0',
+    '30': '11.0',
+    '31': '12.0',
+    '32': '12.1',
+    '33': '13.0',
+    '34': '14.0',
+    '35': '15.0'
+}
+_SDK_SORTED = sorted((int(sdk), version) for sdk, version in _SDK_TO_VERSION.items())
+
+# Runtime ("dangerous") permissions, for O(1) lookups in the security check
+_DANGEROUS_PERMS = frozenset([
+    'android.permission.ACCESS_FINE_LOCATION',
+    'android.permission.ACCESS_COARSE_LOCATION',
+    'android.permission.READ_CONTACTS',
+    'android.permission.WRITE_CONTACTS',
+    'android.permission.READ_CALL_LOG',
+    'android.permission.WRITE_CALL_LOG',
+    'android.permission.READ_CALENDAR',
+    'android.permission.WRITE_CALENDAR',
+    'android.permission.READ_EXTERNAL_STORAGE',
+    'android.permission.WRITE_EXTERNAL_STORAGE',
+    'android.permission.CAMERA',
+    'android.permission.RECORD_AUDIO',
+    'android.permission.READ_SMS',
+    'android.permission.SEND_SMS',
+    'android.permission.RECEIVE_SMS',
+    'android.permission.CALL_PHONE',
+    'android.permission.READ_PHONE_STATE',
+    'android.permission.READ_PHONE_NUMBERS',
+    'android.permission.BODY_SENSORS',
+    'android.permission.ACTIVITY_RECOGNITION'
+])
+
+# Component-name fragments that suggest debug, admin or credential handling
+_RISKY_COMPONENT_PATTERNS = [
+    'debug', 'test', 'backup', 'admin', 'root', 'shell',
+    'install', 'certificate', 'password', 'key'
+]
+_RISKY_COMPONENT_RE = re.compile('|'.join(_RISKY_COMPONENT_PATTERNS), re.IGNORECASE)
+
+# Binary XML (AXML) chunk types used by compiled AndroidManifest.xml files
+_AXML_FILE = 0x0003
+_AXML_STRING_POOL = 0x0001
+_AXML_RESOURCE_MAP = 0x0180
+_AXML_START_ELEMENT = 0x0102
+_AXML_END_ELEMENT = 0x0103
+_AXML_UTF8_FLAG = 0x0100
+_AXML_NO_INDEX = 0xFFFFFFFF
+
+# android: attribute resource IDs, used when the attribute name strings are
+# stripped or obfuscated
+_AXML_ATTR_IDS = {
+    0x01010001: 'label',
+    0x01010003: 'name',
+    0x0101000f: 'debuggable',
+    0x0101020c: 'minSdkVersion',
+    0x0101021b: 'versionCode',
+    0x0101021c: 'versionName',
+    0x01010270: 'targetSdkVersion',
+    0x01010280: 'allowBackup'
+}
+
+# Manifest elements whose android:name is collected, and the result key for each
+_MANIFEST_LISTS = {
+    'uses-permission': 'permissions',
+    'uses-permission-sdk-23': 'permissions',
+    'uses-feature': 'features',
+    'activity': 'activities',
+    'activity-alias': 'activities',
+    'service': 'services',
+    'receiver': 'receivers',
+    'provider': 'providers'
+}
+
+
+def _axml_string(data, offset, utf8):
+    """Decode one string pool entry"""
+    if utf8:
+        # UTF-16 length then UTF-8 byte length, each one or two bytes
+        if data[offset] & 0x80:
+            offset += 1
+        offset += 1
+        length = data[offset]
+        if length & 0x80:
+            length = ((length & 0x7F) << 8) | data[offset + 1]
+            offset += 1
+        offset += 1
+        return data[offset:offset + length].decode('utf-8', 'replace')
+    
+    length = struct.unpack_from('<H', data, offset)[0]
+    if length & 0x8000:
+        length = ((length & 0x7FFF) << 16) | struct.unpack_from('<H', data, offset + 2)[0]
+        offset += 2
+    offset += 2
+    return data[offset:offset + length * 2].decode('utf-16-le', 'replace')
+
+
+def _axml_events(data):
+    """Yield ('start', tag, attrs) / ('end', tag, None) events from binary XML"""
+    if len(data) < 8 or struct.unpack_from('<H', data, 0)[0] != _AXML_FILE:
+        raise ValueError("Not a binary XML document")
+    
+    strings = []
+    resource_ids = []
+    offset = struct.unpack_from('<H', data, 2)[0]
+    end = min(len(data), struct.unpack_from('<I', data, 4)[0])
+    
+    while offset + 8 <= end:
+        chunk_type, header_size, chunk_size = struct.unpack_from('<HHI', data, offset)
+        if chunk_size < 8:
+            break
+        
+        if chunk_type == _AXML_STRING_POOL:
+            count, _, flags, strings_start = struct.unpack_from('<IIII', data, offset + 8)
+            utf8 = bool(flags & _AXML_UTF8_FLAG)
+            offsets = struct.unpack_from(f'<{count}I', data, offset + header_size)
+            base = offset + strings_start
+            strings = [_axml_string(data, base + o, utf8) for o in offsets]
+        elif chunk_type == _AXML_RESOURCE_MAP:
+            count = (chunk_size - header_size) // 4
+            resource_ids = struct.unpack_from(f'<{count}I', data, offset + header_size)
+        elif chunk_type == _AXML_START_ELEMENT:
+            ext = offset + header_size
+            _, name, attr_start, attr_size, attr_count = struct.unpack_from('<IIHHH', data, ext)
+            attrs = {}
+            for i in range(attr_count):
+                attr_name, raw, value_type, value = struct.unpack_from(
+                    '<4xII3xBI', data, ext + attr_start + i * attr_size)
+                if attr_name < len(resource_ids) and resource_ids[attr_name] in _AXML_ATTR_IDS:
+                    key = _AXML_ATTR_IDS[resource_ids[attr_name]]
+                else:
+                    key = strings[attr_name] if attr_name < len(strings) else ''
+                
+                if raw != _AXML_NO_INDEX and raw < len(strings):
+                    attrs[key] = strings[raw]
+                elif value_type == 0x03 and value < len(strings):
+                    attrs[key] = strings[value]
+                elif value_type == 0x12:
+                    attrs[key] = 'true' if value else 'false'
+                elif value_type in (0x10, 0x11):
+                    attrs[key] = str(value if value < 0x80000000 else value - 0x100000000)
+                else:
+                    attrs[key] = f'@0x{value:08x}'
+            yield 'start', strings[name], attrs
+        elif chunk_type == _AXML_END_ELEMENT:
+            name = struct.unpack_from('<I', data, offset + header_size + 4)[0]
+            yield 'end', strings[name], None
+        
+        offset += chunk_size
+
+
+def _text_xml_events(data):
+    """Yield the same events as _axml_events for a plain-text manifest"""
+    for event, elem in ET.iterparse(io.BytesIO(data), events=('start', 'end')):
+        if event == 'end':
+            yield 'end', elem.tag, None
+            elem.clear()
+            continue
+        # Strip the {namespace} prefix so android:name reads as name
+        attrs = {key.rsplit('}', 1)[-1]: value for key, value in elem.attrib.items()}
+        yield 'start', elem.tag, attrs
+
+
+def _sdk_level(value):
+    """API level of an SDK version value as an int, or None if it isn't numeric"""
+    value = str(value) if value is not None else ''
+    return int(value) if value.isdigit() else None
+
+
+def _numeric_sdk(value):
+    """SDK version string from the manifest, or None if it isn't a numeric API level"""
+    return value if _sdk_level(value) is not None else None
+
+
+def _parse_manifest(data):
+    """Read package, version, SDK, permission and component info from AndroidManifest.xml"""
+    events = _text_xml_events(data) if data.lstrip()[:1] == b'<' else _axml_events(data)
+    info = {key: [] for key in set(_MANIFEST_LISTS.values())}
+    component = None
+    launcher_flags = set()
+    
+    for event, tag, attrs in events:
+        if event == 'end':
+            if tag in ('activity', 'activity-alias') and component:
+                if launcher_flags == {'MAIN', 'LAUNCHER'} and 'main_activity' not in info:
+                    info['main_activity'] = component
+                component = None
+            continue
+        
+        if tag == 'manifest':
+            info['package_name'] = attrs.get('package')
+            info['version_code'] = attrs.get('versionCode')
+            info['version_name'] = attrs.get('versionName')
+        elif tag == 'uses-sdk':
+            # Preview codenames ("S") and unresolved references ("@0x...") aren't API levels
+            info['min_sdk'] = _numeric_sdk(attrs.get('minSdkVersion'))
+            info['target_sdk'] = _numeric_sdk(attrs.get('targetSdkVersion'))
+        elif tag == 'application':
+            # A literal label is the app name; resource references need resources.arsc
+            label = attrs.get('label')
+            if label and not label.startswith('@'):
+                info['app_name'] = label
+            info['debuggable'] = attrs.get('debuggable') == 'true'
+            info['allow_backup'] = attrs.get('allowBackup', 'true') != 'false'
+        elif tag in _MANIFEST_LISTS and attrs.get('name'):
+            name = attrs['name']
+            if tag not in ('uses-permission', 'uses-permission-sdk-23', 'uses-feature'):
+                # Expand names relative to the package
+                package = info.get('package_name') or ''
+                if name.startswith('.'):
+                    name = package + name
+                elif '.' not in name and package:
+                    name = f"{package}.{name}"
+            info[_MANIFEST_LISTS[tag]].append(name)
+            if tag in ('activity', 'activity-alias'):
+                component = name
+                launcher_flags = set()
+        elif component and tag == 'action' and attrs.get('name') == 'android.intent.action.MAIN':
+            launcher_flags.add('MAIN')
+        elif component and tag == 'category' and attrs.get('name') == 'android.intent.category.LAUNCHER':
+            launcher_flags.add('LAUNCHER')
+    
+    return {key: value for key, value in info.items() if value is not None}
+
+
+def _signing_info(a):
+    """Describe the first signing certificate of an Androguard APK, or None if unsigned"""
+    cert = a.get_certificates()
+    if not cert:
+        return None
+    return {
+        'issuer': str(cert[0].issuer),
+        'subject': str(cert[0].subject),
+        'serial_number': str(cert[0].serial_number),
+        'fingerprint_md5': cert[0].fingerprint_md5.hex(),
+        'fingerprint_sha1': cert[0].fingerprint_sha1.hex(),
+        'fingerprint_sha256': cert[0].fingerprint_sha256.hex(),
+        'signature_algorithm': cert[0].signature_algorithm
+    }
+
 
 class APKAnalyzer:
     """Class for analyzing APK files"""
@@ -38,6 +361,19 @@ class APKAnalyzer:
         self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'drivemanager_apk_cache')
         os.makedirs(self.cache_dir, exist_ok=True)
         
+        # In-process digest cache so repeated analyses skip rehashing
+        self._hash_cache = OrderedDict()
+        self._hash_cache_lock = threading.Lock()
+        
+        # Independent analysis steps run side by side on this pool
+        self._pool = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix="apk-analysis")
+        
+        # Analysis results waiting to be written to the JSON cache, by APK hash
+        self._dirty_cache = {}
+        self._dirty_cache_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self._flush_cache)
+        
         # Check for external tools
         self.aapt_available = self._check_aapt_available()
         self.adb_available = self._check_adb_available()
@@ -78,8 +414,8 @@ class APKAnalyzer:
         except (subprocess.SubprocessError, FileNotFoundError):
             return False
     
-    def analyze_apk(self, apk_path):
-        """Analyze an APK file and extract detailed information"""
+    def analyze_apk(self, apk_path, header_only=False):
+        """Analyze an APK file; header_only reads just the manifest and skips the signing certificate"""
         if not os.path.exists(apk_path):
             return {'success': False, 'error': 'APK file does not exist'}
             
@@ -87,6 +423,14 @@ class APKAnalyzer:
         apk_hash = self._calculate_file_hash(apk_path)
         cache_file = os.path.join(self.cache_dir, f"{apk_hash}_analysis.json")
         
+        # Results not yet flushed to disk are served from memory
+        with self._dirty_cache_lock:
+            pending = self._dirty_cache.get(apk_hash)
+        if pending is not None and pending.get('apk_path') == apk_path:
+            cached_analysis = dict(pending)
+            cached_analysis['from_cache'] = True
+            return cached_analysis
+        
         # Check if we have a cached analysis
         if os.path.exists(cache_file):
             try:
@@ -112,8 +456,102 @@ class APKAnalyzer:
             'from_cache': False
         }
         
+        # Open the archive once and share it between the zip-based helpers
+        try:
+            apk_zip = zipfile.ZipFile(apk_path, 'r')
+        except Exception as e:
+            analysis_result['success'] = False
+            analysis_result['error'] = f"Could not open APK archive: {e}"
+            return analysis_result
+        
+        try:
+            self._run_analysis(apk_path, apk_zip, analysis_result, header_only)
+        finally:
+            apk_zip.close()
+        
+        # Queue the results for the batched cache write; header-only results are cheap to redo
+        if analysis_result.get('success', False) and not header_only:
+            with self._dirty_cache_lock:
+                self._dirty_cache[apk_hash] = dict(analysis_result)
+            self._maybe_flush()
+        
+        return analysis_result
+    
+    def _maybe_flush(self):
+        """Flush pending cache entries if the flush interval has passed"""
+        if time.monotonic() - self._last_flush >= CACHE_FLUSH_INTERVAL:
+            self._flush_cache()
+    
+    def _flush_cache(self):
+        """Write all pending analysis results to the JSON cache"""
+        with self._dirty_cache_lock:
+            pending = dict(self._dirty_cache)
+            self._last_flush = time.monotonic()
+        
+        # Entries stay in the dirty cache, and keep being served from it, until
+        # their file is written; failed writes are retried on the next flush
+        written = []
+        for apk_hash, analysis in pending.items():
+            cache_file = os.path.join(self.cache_dir, f"{apk_hash}_analysis.json")
+            try:
+                with open(cache_file, 'w') as f:
+                    json.dump(analysis, f)
+                written.append(apk_hash)
+            except Exception as e:
+                logger.error(f"Error writing APK analysis cache {cache_file}: {e}")
+        
+        with self._dirty_cache_lock:
+            for apk_hash in written:
+                # Keep a newer result queued while this flush was writing
+                if self._dirty_cache.get(apk_hash) is pending[apk_hash]:
+                    del self._dirty_cache[apk_hash]
+    
+    def _run_analysis(self, apk_path, apk_zip, analysis_result, header_only=False):
+        """Fill analysis_result using the available analysis methods"""
+        # The manifest alone gives package, version, SDK levels, components,
+        # permissions and the security flags, without a full Androguard load
+        manifest_result = self._read_manifest(apk_zip)
+        if manifest_result.get('success', False):
+            analysis_result.update(manifest_result)
+            analysis_result['analysis_method'] = 'manifest'
+        
+        # The icon decode doesn't depend on the package parse, so it runs on the
+        # pool meanwhile; it returns its own dict and all merging into
+        # analysis_result happens on this thread
+        icon_future = self._pool.submit(self._load_app_icon, apk_zip)
+        try:
+            if not analysis_result.get('package_name'):
+                self._analyze_package(apk_path, apk_zip, analysis_result)
+            elif not header_only and ANDROGUARD_AVAILABLE:
+                # Androguard is still used for what only it reads: the signing certificate
+                signing_result = self._read_signing(apk_path)
+                if signing_result.get('success', False):
+                    if signing_result.get('signing'):
+                        analysis_result['signing'] = signing_result['signing']
+                    analysis_result['analysis_method'] += '+androguard'
+                else:
+                    analysis_result['androguard_error'] = signing_result.get('error')
+        finally:
+            # The caller closes apk_zip once this returns, so the icon read must be done
+            wait([icon_future])
+        
+        # Extract icon and additional resources
+        icon_result = icon_future.result()
+        if analysis_result.get('success', False):
+            icon_result = self._extract_app_icon(icon_result, analysis_result.get('package_name', ''))
+            if icon_result.get('success', False):
+                analysis_result['icon_path'] = icon_result.get('icon_path')
+            
+            # Add platform compatibility info
+            analysis_result['platform_compatibility'] = self._check_platform_compatibility(analysis_result)
+            
+            # Add security analysis
+            analysis_result['security_analysis'] = self._analyze_security(analysis_result)
+    
+    def _analyze_package(self, apk_path, apk_zip, analysis_result):
+        """Read package info without a usable manifest: Androguard, then aapt, then manual extraction"""
         # Try different analysis methods based on available tools
-        if ANDROGUARD_AVAILABLE:
+        if not analysis_result.get('package_name') and ANDROGUARD_AVAILABLE:
             androguard_result = self._analyze_with_androguard(apk_path)
             if androguard_result.get('success', False):
                 analysis_result.update(androguard_result)
@@ -121,7 +559,8 @@ class APKAnalyzer:
             else:
                 # Fall back to other methods
                 analysis_result['androguard_error'] = androguard_result.get('error')
-                
+        
+        # aapt is a subprocess, so it is only started when Androguard didn't give a result
         if not analysis_result.get('package_name') and self.aapt_available:
             aapt_result = self._analyze_with_aapt(apk_path)
             if aapt_result.get('success', False):
@@ -132,7 +571,7 @@ class APKAnalyzer:
                 
         # If all else fails, extract and analyze manually
         if not analysis_result.get('package_name'):
-            manual_result = self._analyze_manual_extraction(apk_path)
+            manual_result = self._analyze_manual_extraction(apk_zip)
             if manual_result.get('success', False):
                 analysis_result.update(manual_result)
                 analysis_result['analysis_method'] = 'manual_extraction'
@@ -140,27 +579,6 @@ class APKAnalyzer:
                 analysis_result['manual_extraction_error'] = manual_result.get('error')
                 analysis_result['success'] = False
                 analysis_result['error'] = "Failed to analyze APK with any available method"
-        
-        # Extract icon and additional resources
-        if analysis_result.get('success', False):
-            icon_result = self._extract_app_icon(apk_path, analysis_result.get('package_name', ''))
-            if icon_result.get('success', False):
-                analysis_result['icon_path'] = icon_result.get('icon_path')
-            
-            # Add platform compatibility info
-            analysis_result['platform_compatibility'] = self._check_platform_compatibility(analysis_result)
-            
-            # Add security analysis
-            analysis_result['security_analysis'] = self._analyze_security(apk_path, analysis_result)
-            
-            # Cache the analysis results
-            try:
-                with open(cache_file, 'w') as f:
-                    json.dump(analysis_result, f)
-            except Exception as e:
-                analysis_result['cache_error'] = str(e)
-        
-        return analysis_result
     
     def _calculate_file_hash(self, file_path):
         """Calculate SHA-256 hash of file"""
@@ -168,15 +586,67 @@ class APKAnalyzer:
             return None
             
         try:
-            hash_sha256 = hashlib.sha256()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
+            st = os.stat(file_path)
+            key = (file_path, st.st_mtime_ns, st.st_size)
+            with self._hash_cache_lock:
+                digest = self._hash_cache.get(key)
+                if digest is not None:
+                    self._hash_cache.move_to_end(key)
+                    return digest
+            
+            digest = self._hash_file(file_path)
+            with self._hash_cache_lock:
+                self._hash_cache[key] = digest
+                while len(self._hash_cache) > HASH_CACHE_MAX_ENTRIES:
+                    self._hash_cache.popitem(last=False)
+            return digest
         except Exception as e:
             print(f"Error calculating hash: {e}")
             return None
     
+    def _hash_file(self, file_path):
+        """Hash a file's full contents with SHA-256"""
+        # file_digest (Python 3.11+) runs the read/update loop in C and
+        # does its own buffering, so the file is opened unbuffered
+        with open(file_path, "rb", buffering=0) as f:
+            try:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+            except AttributeError:
+                hash_sha256 = hashlib.sha256()
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                    hash_sha256.update(chunk)
+                return hash_sha256.hexdigest()
+    
+    def _read_manifest(self, apk_zip):
+        """Parse AndroidManifest.xml from the archive without a full Androguard load"""
+        result = {'success': False}
+        
+        try:
+            result.update(_parse_manifest(apk_zip.read('AndroidManifest.xml')))
+            if result.get('package_name'):
+                result['success'] = True
+            else:
+                result['error'] = "Package name not found in AndroidManifest.xml"
+        except KeyError:
+            result['error'] = "AndroidManifest.xml not found in APK"
+        except Exception as e:
+            result['error'] = str(e)
+            
+        return result
+    
+    def _read_signing(self, apk_path):
+        """Read the signing certificate with Androguard, skipping its manifest and resource parse"""
+        result = {'success': False}
+        
+        try:
+            a = apk.APK(apk_path, skip_analysis=True)
+            result['signing'] = _signing_info(a)
+            result['success'] = True
+        except Exception as e:
+            result['error'] = str(e)
+            
+        return result
+    
     def _analyze_with_androguard(self, apk_path):
         """Analyze APK using Androguard library"""
         result = {'success': False}
@@ -194,17 +664,9 @@ class APKAnalyzer:
             result['max_sdk'] = a.get_max_sdk_version()
             
             # App signing
-            cert = a.get_certificates()
-            if cert:
-                result['signing'] = {
-                    'issuer': str(cert[0].issuer),
-                    'subject': str(cert[0].subject),
-                    'serial_number': str(cert[0].serial_number),
-                    'fingerprint_md5': cert[0].fingerprint_md5.hex(),
-                    'fingerprint_sha1': cert[0].fingerprint_sha1.hex(),
-                    'fingerprint_sha256': cert[0].fingerprint_sha256.hex(),
-                    'signature_algorithm': cert[0].signature_algorithm
-                }
+            signing = _signing_info(a)
+            if signing:
+                result['signing'] = signing
             
             # Components
             result['activities'] = a.get_activities()
@@ -225,6 +687,10 @@ class APKAnalyzer:
             # Libraries
             result['libraries'] = a.get_libraries()
             
+            # Manifest flags for the security check, so it needn't re-parse the APK
+            result['debuggable'] = a.is_debuggable()
+            result['allow_backup'] = a.is_backup()
+            
             # File analysis
             result['files'] = []
             for file_path in a.get_files():
@@ -261,56 +727,30 @@ class APKAnalyzer:
                 
             output = process.stdout
             
-            # Extract basic info with regex
-            package_match = re.search(r"package: name='([^']+)'", output)
-            if package_match:
-                result['package_name'] = package_match.group(1)
-            
-            version_name_match = re.search(r"versionName='([^']+)'", output)
-            if version_name_match:
-                result['version_name'] = version_name_match.group(1)
-            
-            version_code_match = re.search(r"versionCode='(\d+)'", output)
-            if version_code_match:
-                result['version_code'] = version_code_match.group(1)
-            
-            app_name_match = re.search(r"application-label:'([^']+)'", output)
-            if app_name_match:
-                result['app_name'] = app_name_match.group(1)
-            
-            # SDK versions
-            sdk_min_match = re.search(r"sdkVersion:'(\d+)'", output)
-            if sdk_min_match:
-                result['min_sdk'] = sdk_min_match.group(1)
-                
-            sdk_target_match = re.search(r"targetSdkVersion:'(\d+)'", output)
-            if sdk_target_match:
-                result['target_sdk'] = sdk_target_match.group(1)
-            
-            # Extract permissions
             permissions = []
-            permission_matches = re.finditer(r"uses-permission: name='([^']+)'", output)
-            for match in permission_matches:
-                permissions.append(match.group(1))
-            result['permissions'] = permissions
-            
-            # Features
             features = []
-            feature_matches = re.finditer(r"uses-feature: name='([^']+)'", output)
-            for match in feature_matches:
-                features.append(match.group(1))
-            result['features'] = features
+            activities = []
+            
+            # Walk the output once, dispatching on the alternative that matched
+            for match in _AAPT_BADGING_RE.finditer(output):
+                kind = match.lastgroup
+                value = match.group(kind)
+                if kind in _AAPT_SINGLE_FIELDS:
+                    result.setdefault(kind, value)
+                elif kind == 'permission':
+                    permissions.append(value)
+                elif kind == 'feature':
+                    features.append(value)
+                else:
+                    activities.append(value)
             
-            # Activities and other components via dumpsys
-            result['activities'] = []
-            activity_matches = re.finditer(r"launchable-activity: name='([^']+)'", output)
-            for match in activity_matches:
-                result['activities'].append(match.group(1))
+            result['permissions'] = permissions
+            result['features'] = features
+            result['activities'] = activities
             
-            # Check for main activity
-            main_activity_match = re.search(r"launchable-activity: name='([^']+)'", output)
-            if main_activity_match:
-                result['main_activity'] = main_activity_match.group(1)
+            # The first launchable activity is the main one
+            if activities:
+                result['main_activity'] = activities[0]
             
             result['success'] = True
             
@@ -319,122 +759,119 @@ class APKAnalyzer:
             
         return result
     
-    def _analyze_manual_extraction(self, apk_path):
-        """Analyze APK by extracting and parsing its contents manually"""
+    def _analyze_manual_extraction(self, apk_zip):
+        """Analyze APK by reading its archive entries directly"""
         result = {'success': False}
-        extraction_dir = None
         
         try:
-            # Create a temporary directory for extraction
-            extraction_dir = tempfile.mkdtemp(prefix='apk_analysis_')
-            
-            # Extract the APK using zipfile
-            with zipfile.ZipFile(apk_path, 'r') as z:
-                z.extractall(extraction_dir)
-            
             # Look for AndroidManifest.xml
-            manifest_path = os.path.join(extraction_dir, 'AndroidManifest.xml')
-            if not os.path.exists(manifest_path):
+            names = set(apk_zip.namelist())
+            if 'AndroidManifest.xml' not in names:
                 result['error'] = "AndroidManifest.xml not found in APK"
                 return result
             
-            # Binary XML can't be directly parsed, looking for package name in other files
+            # The manifest carries the real package name and version info
+            try:
+                result.update(_parse_manifest(apk_zip.read('AndroidManifest.xml')))
+            except Exception:
+                pass
+            
             # Check for classes.dex (basic validation)
-            if os.path.exists(os.path.join(extraction_dir, 'classes.dex')):
+            if 'classes.dex' in names:
                 result['has_dex'] = True
             
-            # Look for resource files to extract app name
-            res_dir = os.path.join(extraction_dir, 'res')
-            if os.path.exists(res_dir):
-                # Check for app name in strings.xml files
-                for root, dirs, files in os.walk(res_dir):
-                    for file in files:
-                        if file == 'strings.xml':
-                            try:
-                                tree = ET.parse(os.path.join(root, file))
-                                for string in tree.findall(".//string[@name='app_name']"):
-                                    result['app_name'] = string.text
-                                    break
-                            except Exception:
-                                pass
+            # Scan the central directory once: ZipInfo already carries each
+            # entry's uncompressed size, and the folder layout comes from the names
+            sensitive_files = []
+            file_stats = {}
+            total_files = 0
+            strings_files = []
+            assets = set()
+            resource_types = {}
+            smali_tree = {}
+            
+            for info in apk_zip.infolist():
+                name = info.filename
+                parts = name.split('/')
+                
+                if parts[0] == 'assets' and len(parts) > 1 and parts[1]:
+                    assets.add(parts[1])
+                elif parts[0] == 'res' and len(parts) > 2 and parts[2]:
+                    resource_types.setdefault(parts[1], set()).add(parts[2])
+                elif parts[0] == 'smali':
+                    node = smali_tree
+                    for part in parts[1:-1]:
+                        node = node.setdefault(part, {})
+                
+                if info.is_dir():
+                    continue
+                
+                if parts[0] == 'res' and parts[-1] == 'strings.xml':
+                    strings_files.append(name)
+                
+                # Look for potentially sensitive files
+                if _SENSITIVE_FILE_RE.search(parts[-1].lower()):
+                    sensitive_files.append(name)
+                
+                # Group by top-level folder, with root entries under '(root)'
+                bucket = parts[0] if len(parts) > 1 else '(root)'
+                stats = file_stats.get(bucket)
+                if stats is None:
+                    stats = file_stats[bucket] = {'count': 0, 'size': 0}
+                stats['count'] += 1
+                stats['size'] += info.file_size
+                total_files += 1
+            
+            # Check for app name in strings.xml files
+            for name in strings_files:
+                try:
+                    # Stream the entry and free each element once seen
+                    with apk_zip.open(name) as f:
+                        for event, elem in ET.iterparse(f, events=('end',)):
+                            if elem.tag == 'string' and elem.get('name') == 'app_name':
+                                result['app_name'] = elem.text
+                                break
+                            elem.clear()
+                except Exception:
+                    pass
             
             # Look for assets
-            assets_dir = os.path.join(extraction_dir, 'assets')
-            if os.path.exists(assets_dir):
+            if assets:
                 result['has_assets'] = True
-                result['asset_count'] = len(os.listdir(assets_dir))
+                result['asset_count'] = len(assets)
             
             # Count resource types
-            if os.path.exists(res_dir):
-                resource_types = {}
-                for res_type in os.listdir(res_dir):
-                    if os.path.isdir(os.path.join(res_dir, res_type)):
-                        resource_types[res_type] = len(os.listdir(os.path.join(res_dir, res_type)))
-                result['resource_types'] = resource_types
-            
-            # Look for potentially sensitive files
-            sensitive_patterns = [
-                'password', 'key', 'secret', 'credential', 'token', 'apikey',
-                'firebase', 'google-services.json', '.keystore', '.jks'
-            ]
-            
-            sensitive_files = []
-            for root, dirs, files in os.walk(extraction_dir):
-                for file in files:
-                    lower_file = file.lower()
-                    if any(pattern in lower_file for pattern in sensitive_patterns):
-                        sensitive_files.append(os.path.relpath(os.path.join(root, file), extraction_dir))
+            if resource_types:
+                result['resource_types'] = {res_type: len(entries) for res_type, entries in resource_types.items()}
             
             if sensitive_files:
                 result['sensitive_files'] = sensitive_files
             
             # If package name is still unknown, make an educated guess from structure
-            if not result.get('package_name'):
-                # Look at folder structure in classes.dex
-                smali_dir = os.path.join(extraction_dir, 'smali')
-                if os.path.exists(smali_dir):
-                    # Navigate the directory structure to find likely package
-                    current_dir = smali_dir
-                    parts = []
-                    
-                    # Depth-first search for main activity class
-                    for _ in range(5):  # Max depth of 5
-                        dirs = [d for d in os.listdir(current_dir) if os.path.isdir(os.path.join(current_dir, d))]
-                        if not dirs:
+            if not result.get('package_name') and smali_tree:
+                # Navigate the smali folder structure to find likely package
+                node = smali_tree
+                parts = []
+                
+                # Depth-first search for main activity class
+                for _ in range(5):  # Max depth of 5
+                    if not node:
+                        break
+                        
+                    # Prefer common package prefixes
+                    priority_prefixes = ['com', 'org', 'net', 'io', 'app']
+                    for prefix in priority_prefixes:
+                        if prefix in node:
                             break
-                            
-                        # Prefer common package prefixes
-                        priority_prefixes = ['com', 'org', 'net', 'io', 'app']
-                        for prefix in priority_prefixes:
-                            if prefix in dirs:
-                                parts.append(prefix)
-                                current_dir = os.path.join(current_dir, prefix)
-                                break
-                        else:
-                            # If no priority prefix, just take the first directory
-                            parts.append(dirs[0])
-                            current_dir = os.path.join(current_dir, dirs[0])
-                    
-                    if parts:
-                        result['package_name'] = '.'.join(parts)
-                        result['package_name_source'] = 'guessed_from_structure'
-            
-            # Extract file count and size statistics
-            file_stats = {}
-            total_files = 0
-            
-            for root, dirs, files in os.walk(extraction_dir):
-                dir_name = os.path.basename(root)
-                if dir_name not in file_stats:
-                    file_stats[dir_name] = {'count': 0, 'size': 0}
+                    else:
+                        # If no priority prefix, just take the first directory
+                        prefix = next(iter(node))
+                    parts.append(prefix)
+                    node = node[prefix]
                 
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_size = os.path.getsize(file_path)
-                    
-                    file_stats[dir_name]['count'] += 1
-                    file_stats[dir_name]['size'] += file_size
-                    total_files += 1
+                if parts:
+                    result['package_name'] = '.'.join(parts)
+                    result['package_name_source'] = 'guessed_from_structure'
             
             result['file_stats'] = file_stats
             result['total_files'] = total_files
@@ -444,67 +881,47 @@ class APKAnalyzer:
         except Exception as e:
             result['error'] = str(e)
             
-        finally:
-            # Clean up extraction directory
-            if extraction_dir and os.path.exists(extraction_dir):
-                shutil.rmtree(extraction_dir, ignore_errors=True)
-            
         return result
     
-    def _extract_app_icon(self, apk_path, package_name):
-        """Extract the app icon from the APK"""
+    def _load_app_icon(self, apk_zip):
+        """Read the app icon from the APK as PNG bytes"""
         result = {'success': False}
-        extraction_dir = None
         
         try:
-            # Create a temporary directory for extraction
-            extraction_dir = tempfile.mkdtemp(prefix='apk_icon_')
-            
-            # Extract the APK using zipfile
-            with zipfile.ZipFile(apk_path, 'r') as z:
-                z.extractall(extraction_dir)
-            
-            # Look for icon files in common locations
-            icon_path = None
+            names = set(apk_zip.namelist())
+            icon_name = None
             
             # Check for ic_launcher.png in different drawable folders
             for dpi in ['xxxhdpi', 'xxhdpi', 'xhdpi', 'hdpi', 'mdpi']:
-                icon_path = os.path.join(extraction_dir, 'res', f'drawable-{dpi}', 'ic_launcher.png')
-                if os.path.exists(icon_path):
-                    break
-                    
-                # Also check without -dpi suffix
-                icon_path = os.path.join(extraction_dir, 'res', 'drawable', 'ic_launcher.png')
-                if os.path.exists(icon_path):
+                candidate = f'res/drawable-{dpi}/ic_launcher.png'
+                if candidate in names:
+                    icon_name = candidate
                     break
             
-            # If no icon found, try to find any PNG in drawable folders
-            if not icon_path or not os.path.exists(icon_path):
-                for root, dirs, files in os.walk(os.path.join(extraction_dir, 'res')):
-                    if 'drawable' in root.lower():
-                        for file in files:
-                            if file.endswith('.png'):
-                                icon_path = os.path.join(root, file)
-                                break
-                        if icon_path:
-                            break
+            # Also check without -dpi suffix
+            if not icon_name and 'res/drawable/ic_launcher.png' in names:
+                icon_name = 'res/drawable/ic_launcher.png'
             
-            # If icon found, copy to cache directory
-            if icon_path and os.path.exists(icon_path):
-                # Create a sanitized filename based on package name
-                sanitized_name = ''.join(c for c in package_name if c.isalnum() or c == '.')
-                cached_icon_path = os.path.join(self.cache_dir, f"{sanitized_name}_icon.png")
+            # If no icon found, try to find any PNG in drawable folders
+            if not icon_name:
+                for info in apk_zip.infolist():
+                    name = info.filename
+                    if name.startswith('res/') and 'drawable' in name.lower() and name.endswith('.png'):
+                        icon_name = name
+                        break
+            
+            if icon_name:
+                icon_data = apk_zip.read(icon_name)
                 
-                # Resize the icon if PIL is available
+                # Resize the icon if PIL is available, otherwise keep it as is
                 if PIL_AVAILABLE:
-                    img = Image.open(icon_path)
+                    img = Image.open(io.BytesIO(icon_data))
                     img = img.resize((128, 128), Image.LANCZOS)
-                    img.save(cached_icon_path)
-                else:
-                    # Otherwise just copy the file
-                    shutil.copy2(icon_path, cached_icon_path)
+                    buffer = io.BytesIO()
+                    img.save(buffer, 'PNG')
+                    icon_data = buffer.getvalue()
                 
-                result['icon_path'] = cached_icon_path
+                result['icon_data'] = icon_data
                 result['success'] = True
             else:
                 result['error'] = "Could not find app icon"
@@ -512,10 +929,26 @@ class APKAnalyzer:
         except Exception as e:
             result['error'] = str(e)
             
-        finally:
-            # Clean up extraction directory
-            if extraction_dir and os.path.exists(extraction_dir):
-                shutil.rmtree(extraction_dir, ignore_errors=True)
+        return result
+    
+    def _extract_app_icon(self, icon_result, package_name):
+        """Save an icon loaded by _load_app_icon to the cache directory"""
+        if not icon_result.get('success', False):
+            return icon_result
+        
+        result = {'success': False}
+        
+        try:
+            # Create a sanitized filename based on package name
+            sanitized_name = ''.join(c for c in package_name if c.isalnum() or c == '.')
+            cached_icon_path = os.path.join(self.cache_dir, f"{sanitized_name}_icon.png")
+            with open(cached_icon_path, 'wb') as f:
+                f.write(icon_result['icon_data'])
+            
+            result['icon_path'] = cached_icon_path
+            result['success'] = True
+        except Exception as e:
+            result['error'] = str(e)
             
         return result
     
@@ -533,57 +966,21 @@ class APKAnalyzer:
         min_sdk = apk_info.get('min_sdk')
         target_sdk = apk_info.get('target_sdk')
         
-        sdk_to_version = {
-            '1': '1.0',
-            '2': '1.1',
-            '3': '1.5',
-            '4': '1.6',
-            '5': '2.0',
-            '6': '2.0.1',
-            '7': '2.1',
-            '8': '2.2',
-            '9': '2.3',
-            '10': '2.3.3',
-            '11': '3.0',
-            '12': '3.1',
-            '13': '3.2',
-            '14': '4.0',
-            '15': '4.0.3',
-            '16': '4.1',
-            '17': '4.2',
-            '18': '4.3',
-            '19': '4.4',
-            '21': '5.0',
-            '22': '5.1',
-            '23': '6.0',
-            '24': '7.0',
-            '25': '7.1',
-            '26': '8.0',
-            '27': '8.1',
-            '28': '9.0',
-            '29': '10.0',
-            '30': '11.0',
-            '31': '12.0',
-            '32': '12.1',
-            '33': '13.0',
-            '34': '14.0',
-            '35': '15.0'
-        }
+        min_level = _sdk_level(min_sdk)
         
         if min_sdk:
-            min_version = sdk_to_version.get(str(min_sdk), f"SDK {min_sdk}")
+            min_version = _SDK_TO_VERSION.get(str(min_sdk), f"SDK {min_sdk}")
             compatibility['min_android_version'] = min_version
-            
+        
+        if min_level is not None:
             # Generate list of compatible Android versions
-            for sdk, version in sdk_to_version.items():
-                if int(sdk) >= int(min_sdk):
-                    compatibility['compatible_android_versions'].append({
-                        'sdk': sdk,
-                        'version': version
-                    })
+            compatibility['compatible_android_versions'] = [
+                {'sdk': str(sdk), 'version': version}
+                for sdk, version in _SDK_SORTED if sdk >= min_level
+            ]
         
         if target_sdk:
-            target_version = sdk_to_version.get(str(target_sdk), f"SDK {target_sdk}")
+            target_version = _SDK_TO_VERSION.get(str(target_sdk), f"SDK {target_sdk}")
             compatibility['target_android_version'] = target_version
         
         # Check for emulator support
@@ -596,18 +993,18 @@ class APKAnalyzer:
         }
         
         # Check for Windows compatibility with WSA (Windows Subsystem for Android)
-        if min_sdk:
+        if min_level is not None:
             # WSA supports Android 11 (API 30) and higher
-            compatibility['windows_wsa'] = int(min_sdk) <= 30
+            compatibility['windows_wsa'] = min_level <= 30
         
         # Check for ChromeOS compatibility
-        if min_sdk:
+        if min_level is not None:
             # ChromeOS supports Android 9.0+ apps well
-            compatibility['chromeos'] = int(min_sdk) <= 28
+            compatibility['chromeos'] = min_level <= 28
         
         return compatibility
     
-    def _analyze_security(self, apk_path, apk_info):
+    def _analyze_security(self, apk_info):
         """Perform security analysis on the APK"""
         security = {
             'permissions': {
@@ -622,33 +1019,10 @@ class APKAnalyzer:
         }
         
         # Categorize permissions by protection level
-        dangerous_permissions = [
-            'android.permission.ACCESS_FINE_LOCATION',
-            'android.permission.ACCESS_COARSE_LOCATION',
-            'android.permission.READ_CONTACTS',
-            'android.permission.WRITE_CONTACTS',
-            'android.permission.READ_CALL_LOG',
-            'android.permission.WRITE_CALL_LOG',
-            'android.permission.READ_CALENDAR',
-            'android.permission.WRITE_CALENDAR',
-            'android.permission.READ_EXTERNAL_STORAGE',
-            'android.permission.WRITE_EXTERNAL_STORAGE',
-            'android.permission.CAMERA',
-            'android.permission.RECORD_AUDIO',
-            'android.permission.READ_SMS',
-            'android.permission.SEND_SMS',
-            'android.permission.RECEIVE_SMS',
-            'android.permission.CALL_PHONE',
-            'android.permission.READ_PHONE_STATE',
-            'android.permission.READ_PHONE_NUMBERS',
-            'android.permission.BODY_SENSORS',
-            'android.permission.ACTIVITY_RECOGNITION'
-        ]
-        
         permissions = apk_info.get('permissions', [])
         
         for permission in permissions:
-            if permission in dangerous_permissions:
+            if permission in _DANGEROUS_PERMS:
                 security['permissions']['dangerous'].append(permission)
             elif permission.startswith('android.permission.'):
                 security['permissions']['normal'].append(permission)
@@ -668,47 +1042,37 @@ class APKAnalyzer:
         components.extend(apk_info.get('receivers', []))
         components.extend(apk_info.get('providers', []))
         
-        risky_patterns = [
-            'debug', 'test', 'backup', 'admin', 'root', 'shell',
-            'install', 'certificate', 'password', 'key'
-        ]
-        
         for component in components:
-            for pattern in risky_patterns:
-                if pattern.lower() in component.lower():
-                    security['risky_components'].append({
-                        'name': component,
-                        'risk_factor': pattern
-                    })
-                    break
+            match = _RISKY_COMPONENT_RE.search(component)
+            if match:
+                security['risky_components'].append({
+                    'name': component,
+                    'risk_factor': match.group(0).lower()
+                })
         
         # Check for potential vulnerabilities
         vulnerabilities = []
         
-        # Check for debuggable flag
-        if ANDROGUARD_AVAILABLE:
-            try:
-                a = apk.APK(apk_path)
-                if a.is_debuggable():
-                    vulnerabilities.append({
-                        'name': 'Debuggable Application',
-                        'severity': 'High',
-                        'description': 'The application is debuggable, which allows attackers to connect a debugger and potentially extract sensitive information.'
-                    })
-                
-                # Check if backup is allowed
-                if a.is_backup():
-                    vulnerabilities.append({
-                        'name': 'Backup Enabled',
-                        'severity': 'Medium',
-                        'description': 'The application allows backup, which could potentially lead to data leakage.'
-                    })
-            except Exception:
-                pass
+        # Check for debuggable flag (read from the manifest during analysis)
+        if apk_info.get('debuggable'):
+            vulnerabilities.append({
+                'name': 'Debuggable Application',
+                'severity': 'High',
+                'description': 'The application is debuggable, which allows attackers to connect a debugger and potentially extract sensitive information.'
+            })
+        
+        # Check if backup is allowed
+        if apk_info.get('allow_backup'):
+            vulnerabilities.append({
+                'name': 'Backup Enabled',
+                'severity': 'Medium',
+                'description': 'The application allows backup, which could potentially lead to data leakage.'
+            })
         
         # Check target SDK for known security concerns
         target_sdk = apk_info.get('target_sdk')
-        if target_sdk and int(target_sdk) < 23:
+        target_level = _sdk_level(target_sdk)
+        if target_level is not None and target_level < 23:
             vulnerabilities.append({
                 'name': 'Outdated Target SDK',
                 'severity': 'Medium',
@@ -5,7 +5,7 @@ Handles database connections and operations.
 
 import os
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -15,6 +15,12 @@ from models import Base, File, Tag, Application, CloudSync, Recommendation, User
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """Use write-ahead logging so cache reads don't block on writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
 class DatabaseManager:
     """Database manager for Drive-Manager Pro"""
     
@@ -37,11 +43,14 @@ class DatabaseManager:
                 return False
             
             self.engine = create_engine(database_url)
+            if self.engine.dialect.name == 'sqlite':
+                event.listen(self.engine, 'connect', _enable_sqlite_wal)
             self.session_factory = sessionmaker(bind=self.engine)
             self.Session = scoped_session(self.session_factory)
             
-            # Create tables if they don't exist
+            # Create tables if they don't exist, and add columns newer than existing ones
             Base.metadata.create_all(self.engine)
+            self.add_missing_columns()
             
             self.is_connected = True
             logger.info("Successfully connected to the database")
@@ -52,6 +61,31 @@ class DatabaseManager:
             self.is_connected = False
             return False
     
+    def add_missing_columns(self, tables=None):
+        """Add nullable model columns missing from existing tables, which create_all never alters"""
+        tables = tables if tables is not None else Base.metadata.sorted_tables
+        inspector = inspect(self.engine)
+        quote = self.engine.dialect.identifier_preparer.quote
+        
+        with self.engine.begin() as connection:
+            for table in tables:
+                if not inspector.has_table(table.name):
+                    continue
+                
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    if not column.nullable:
+                        logger.warning(f"Cannot add required column {table.name}.{column.name} to an existing table")
+                        continue
+                    
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(
+                        f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                    ))
+                    logger.info(f"Added column {table.name}.{column.name}")
+    
     def get_session(self):
         """Get a database session"""
         if not self.is_connected:
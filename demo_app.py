@@ -18,7 +18,7 @@ import hashlib
 from database import db_manager
 from models import File, Tag, Application, CloudSync, Recommendation, UserPreference
 from app_generator import app_generator
-from account_manager import account_manager
+from account_manager import get_account_manager
 from ai_media_generator import ai_media_generator
 from file_system_web import FileMetadata, DuplicateDetector
 from apk_manager import apk_manager
@@ -169,7 +169,7 @@ class DemoHandler(BaseHTTPRequestHandler):
                 return
             
             # Register the user
-            result = account_manager.register_user(username, email, password, first_name, last_name)
+            result = get_account_manager().register_user(username, email, password, first_name, last_name)
             
             if result.get("success"):
                 self._send_json_response(201, result)
@@ -190,7 +190,7 @@ class DemoHandler(BaseHTTPRequestHandler):
             user_agent = self.headers.get('User-Agent', '')
             
             # Login the user
-            result = account_manager.login(username_or_email, password, ip_address, user_agent)
+            result = get_account_manager().login(username_or_email, password, ip_address, user_agent)
             
             if result.get("success"):
                 self._send_json_response(200, result)
@@ -206,7 +206,7 @@ class DemoHandler(BaseHTTPRequestHandler):
                 return
             
             # Validate the session
-            result = account_manager.validate_session(session_token)
+            result = get_account_manager().validate_session(session_token)
             
             if result.get("success"):
                 self._send_json_response(200, result)
@@ -222,7 +222,7 @@ class DemoHandler(BaseHTTPRequestHandler):
                 return
             
             # Logout the user
-            result = account_manager.logout(session_token)
+            result = get_account_manager().logout(session_token)
             self._send_json_response(200, result)
             
         # Update user profile endpoint
@@ -235,7 +235,7 @@ class DemoHandler(BaseHTTPRequestHandler):
                 return
             
             # Update the user profile
-            result = account_manager.update_user_profile(user_id, profile_data)
+            result = get_account_manager().update_user_profile(user_id, profile_data)
             
             if result.get("success"):
                 self._send_json_response(200, result)
@@ -253,7 +253,7 @@ class DemoHandler(BaseHTTPRequestHandler):
                 return
             
             # Change the password
-            result = account_manager.change_password(user_id, current_password, new_password)
+            result = get_account_manager().change_password(user_id, current_password, new_password)
             
             if result.get("success"):
                 self._send_json_response(200, result)
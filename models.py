@@ -4,7 +4,7 @@ Contains SQLAlchemy ORM models for files, tags, user preferences, and other data
 """
 
 import datetime
-from sqlalchemy import Column, Integer, String, Boolean, Float, Text, DateTime, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, String, Boolean, Float, Text, DateTime, ForeignKey, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -132,6 +132,9 @@ class Recommendation(Base):
 class OllamaModelCache(Base):
     """Model representing cached results from laptop-hosted Ollama models for learning"""
     __tablename__ = 'ollama_model_cache'
+    __table_args__ = (
+        Index('ix_ollama_model_cache_hash_model', 'result_hash', 'model_name'),
+    )
     
     id = Column(Integer, primary_key=True)
     model_name = Column(String, nullable=False)
@@ -139,7 +142,9 @@ class OllamaModelCache(Base):
     parameters = Column(Text, nullable=False)  # Stored as JSON
     result_hash = Column(String, nullable=False)  # Hash of the result for quick lookup
     result_data = Column(LargeBinary)  # The actual result data (image or video)
+    result_path = Column(String)  # File holding the result data, when stored outside the database
     thumbnail = Column(LargeBinary)  # Thumbnail for quick preview
+    prompt_embedding = Column(LargeBinary)  # Normalized float32 prompt embedding for similarity lookup
     media_type = Column(String, nullable=False)  # image, video
     width = Column(Integer)
     height = Column(Integer)
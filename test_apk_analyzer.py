@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for APK manifest parsing.
+Builds a binary AndroidManifest.xml in memory and checks how it is analyzed.
+"""
+
+import os
+import struct
+import tempfile
+import zipfile
+from apk_analyzer import APKAnalyzer, apk_analyzer, _parse_manifest
+
+# android: attribute resource IDs, in the same order as their strings in the pool
+RESOURCE_IDS = {
+    'label': 0x01010001,
+    'versionCode': 0x0101021b,
+    'minSdkVersion': 0x0101020c,
+    'targetSdkVersion': 0x01010270,
+    'name': 0x01010003,
+}
+
+TYPE_STRING = 0x03
+TYPE_INT_DEC = 0x10
+
+
+def build_axml(elements):
+    """Encode (tag, [(attribute, value)]) elements as a flat binary XML document"""
+    strings = list(RESOURCE_IDS)
+    for tag, attrs in elements:
+        for value in [tag] + [part for attr in attrs for part in attr]:
+            if isinstance(value, str) and value not in strings:
+                strings.append(value)
+    index = {value: i for i, value in enumerate(strings)}
+
+    # UTF-16 string pool
+    data = b''
+    offsets = []
+    for value in strings:
+        offsets.append(len(data))
+        data += struct.pack('<H', len(value)) + value.encode('utf-16-le') + b'\0\0'
+    while len(data) % 4:
+        data += b'\0'
+    strings_start = 28 + 4 * len(strings)
+    pool = struct.pack('<HHIIIIII', 0x0001, 28, strings_start + len(data), len(strings), 0, 0, strings_start, 0)
+    pool += struct.pack(f'<{len(offsets)}I', *offsets) + data
+
+    resource_map = struct.pack('<HHI', 0x0180, 8, 8 + 4 * len(RESOURCE_IDS))
+    resource_map += struct.pack(f'<{len(RESOURCE_IDS)}I', *RESOURCE_IDS.values())
+
+    body = b''
+    for tag, attrs in elements:
+        attr_data = b''
+        for name, value in attrs:
+            if isinstance(value, str):
+                raw, data_type, data_value = index[value], TYPE_STRING, index[value]
+            else:
+                raw, data_type, data_value = 0xFFFFFFFF, TYPE_INT_DEC, value
+            attr_data += struct.pack('<IIIHBBI', 0xFFFFFFFF, index[name], raw, 8, 0, data_type, data_value)
+        extension = struct.pack('<IIHHHHHH', 0xFFFFFFFF, index[tag], 20, 20, len(attrs), 0, 0, 0) + attr_data
+        body += struct.pack('<HHIII', 0x0102, 16, 16 + len(extension), 1, 0xFFFFFFFF) + extension
+    for tag, _ in reversed(elements):
+        body += struct.pack('<HHIIIII', 0x0103, 16, 24, 1, 0xFFFFFFFF, 0xFFFFFFFF, index[tag])
+
+    content = pool + resource_map + body
+    return struct.pack('<HHI', 0x0003, 8, 8 + len(content)) + content
+
+
+def test_numeric_sdk_versions():
+    """Numeric SDK versions are read from a binary manifest"""
+    manifest = build_axml([
+        ('manifest', [('package', 'com.test.myapp'), ('versionCode', 7)]),
+        ('uses-sdk', [('minSdkVersion', 21), ('targetSdkVersion', 34)]),
+    ])
+    info = _parse_manifest(manifest)
+
+    assert info['package_name'] == 'com.test.myapp'
+    assert info['version_code'] == '7'
+    assert info['min_sdk'] == '21'
+    assert info['target_sdk'] == '34'
+
+    compatibility = apk_analyzer._check_platform_compatibility(info)
+    assert compatibility['windows_wsa'] is True
+    assert compatibility['compatible_android_versions'][0]['sdk'] == '21'
+
+
+def test_non_numeric_sdk_versions():
+    """A preview codename or resource reference as SDK version doesn't break the analysis"""
+    manifest = build_axml([
+        ('manifest', [('package', 'com.test.preview')]),
+        ('uses-sdk', [('minSdkVersion', 'S'), ('targetSdkVersion', '@0x7f0b0001')]),
+    ])
+    info = _parse_manifest(manifest)
+
+    assert info['package_name'] == 'com.test.preview'
+    assert info.get('min_sdk') is None
+    assert info.get('target_sdk') is None
+
+    compatibility = apk_analyzer._check_platform_compatibility(info)
+    assert compatibility['compatible_android_versions'] == []
+    assert 'windows_wsa' not in compatibility
+
+    # Values straight from Androguard aren't filtered by _parse_manifest
+    compatibility = apk_analyzer._check_platform_compatibility({'min_sdk': 'S', 'target_sdk': 'S'})
+    assert compatibility['min_android_version'] == 'SDK S'
+    security = apk_analyzer._analyze_security({'target_sdk': 'S'})
+    assert all(v['name'] != 'Outdated Target SDK' for v in security['potential_vulnerabilities'])
+
+
+def test_manifest_first_analysis():
+    """A parseable manifest is enough for a full analysis without Androguard's manifest parse"""
+    manifest = build_axml([
+        ('manifest', [('package', 'com.test.myapp'), ('versionCode', 3)]),
+        ('uses-sdk', [('minSdkVersion', 21), ('targetSdkVersion', 22)]),
+        ('uses-permission', [('name', 'android.permission.CAMERA')]),
+        ('application', [('label', 'Test App')]),
+        ('activity', [('name', '.MainActivity')]),
+    ])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        apk_path = os.path.join(temp_dir, 'test.apk')
+        with zipfile.ZipFile(apk_path, 'w') as apk_zip:
+            apk_zip.writestr('AndroidManifest.xml', manifest)
+            apk_zip.writestr('classes.dex', b'dex\n035\0')
+
+        analyzer = APKAnalyzer(cache_dir=os.path.join(temp_dir, 'cache'))
+        result = analyzer.analyze_apk(apk_path)
+        analyzer._flush_cache()
+
+    assert result['success']
+    assert result['analysis_method'].startswith('manifest')
+    assert result['package_name'] == 'com.test.myapp'
+    assert result['app_name'] == 'Test App'
+    assert result['permissions'] == ['android.permission.CAMERA']
+    assert result['activities'] == ['com.test.myapp.MainActivity']
+    assert 'CAMERA' in str(result['security_analysis']['permissions']['dangerous'])
+
+
+if __name__ == "__main__":
+    test_numeric_sdk_versions()
+    test_non_numeric_sdk_versions()
+    test_manifest_first_analysis()
+    print("APK analyzer tests passed")